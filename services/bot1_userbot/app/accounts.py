@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from pyrogram import Client
+from pyrogram.errors import Unauthorized
+
+from .config import settings
+from .fake_telegram import FakeClient, FakeOptions
+from .metrics import metrics
+from .peer_cache import PeerCache
+from .scheduler import TelegramScheduler
+from .storage import Storage
+
+log = logging.getLogger("bot1.accounts")
+
+MAIN_ACCOUNT = "main"
+
+
+def _make_client(name: str, session_string: str):
+    if settings.tg_backend == "fake":
+        # симулятор Telegram без сети — для нагрузочных и сквозных тестов
+        return FakeClient(
+            f"bot1_{name}",
+            FakeOptions(
+                latency_ms=settings.fake_tg_latency_ms,
+                jitter_ms=settings.fake_tg_jitter_ms,
+                flood_rate=settings.fake_tg_flood_rate,
+                flood_wait_sec=settings.fake_tg_flood_wait_sec,
+                forbidden_rate=settings.fake_tg_forbidden_rate,
+                seed=settings.fake_tg_seed,
+            ),
+        )
+    return Client(
+        name=f"bot1_{name}",
+        api_id=settings.tg_api_id,
+        api_hash=settings.tg_api_hash,
+        session_string=session_string,
+        workdir="/data",
+        in_memory=False,
+        # FloodWait целиком обрабатывает планировщик, pyrogram не должен спать молча
+        sleep_threshold=0,
+    )
+
+
+class Account:
+    """Аккаунт пула userbot'ов: свой клиент pyrogram, планировщик (лимиты Telegram — на аккаунт),
+    кэш peer'ов (access_hash у каждого аккаунта свой) и состояние здоровья.
+
+    Сетевые ошибки и отозванная сессия выводят аккаунт из ротации с экспоненциальным backoff'ом;
+    ошибки самих запросов (нет прав, приватность) и FloodWait (его блокирует планировщик по методу) — нет.
+    """
+
+    def __init__(self, name: str, session_string: str, storage: Storage):
+        self.name = name
+        self.client = _make_client(name, session_string)
+        self.peers = PeerCache(
+            storage, account=name, ttl_sec=settings.peer_cache_ttl_sec, max_size=settings.peer_cache_size
+        )
+        self.peers.attach(self.client)
+        self.scheduler = TelegramScheduler(
+            self.client,
+            concurrency=settings.tg_concurrency,
+            default_rate=settings.tg_default_rate,
+            method_rates=settings.tg_method_rates,
+            burst=settings.tg_bucket_burst,
+            flood_deadline_sec=settings.tg_flood_deadline_sec,
+            account=name,
+            on_error=self.record,
+        )
+        self.started = False
+        self.failures = 0
+        self.backoff_until = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return self.started and time.monotonic() >= self.backoff_until
+
+    def record(self, error: Optional[BaseException]) -> None:
+        if error is None:
+            self.failures = 0
+            return
+        if isinstance(error, Unauthorized):
+            # сессия отозвана / аккаунт удалён — сам не восстановится
+            delay = settings.account_backoff_max_sec
+        elif isinstance(error, (OSError, asyncio.TimeoutError)):
+            self.failures += 1
+            delay = min(settings.account_backoff_base_sec * 2 ** (self.failures - 1), settings.account_backoff_max_sec)
+        else:
+            return
+        self.backoff_until = max(self.backoff_until, time.monotonic() + delay)
+        self.last_error = repr(error)
+        log.warning("Account %s backed off for %.0fs: %r", self.name, delay, error)
+
+    async def start(self) -> None:
+        await self.client.start()
+        me = await self.client.get_me()
+        self.started = True
+        log.info("Account %s started as %s", self.name, me.id)
+
+    async def stop(self) -> None:
+        # is_connected — если start() упал после подключения (например, на get_me)
+        if self.started or self.client.is_connected:
+            self.started = False
+            await self.client.stop()
+        await self.peers.flush()
+
+    def export_metrics(self) -> None:
+        self.scheduler.export_metrics()
+        metrics.set("bot1_account_available", int(self.available), account=self.name)
+        metrics.set("bot1_account_backoff_seconds", max(0.0, self.backoff_until - time.monotonic()), account=self.name)
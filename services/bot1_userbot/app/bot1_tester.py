@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
 import base64
+import itertools
 import json
 import sys
-from typing import Any, Dict, List, Optional
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 try:
     import httpx
@@ -61,6 +65,20 @@ def req(client: httpx.Client, method: str, url: str, payload: Optional[Dict[str,
     return r.status_code, r.text
 
 
+def wait_job(client: httpx.Client, base: str, job_id: str, timeout: float = 300) -> Any:
+    deadline = time.monotonic() + timeout
+    body: Any = None
+    while time.monotonic() < deadline:
+        code, body = req(client, "GET", f"{base}/api/crm/jobs/{job_id}")
+        if code != 200 or not isinstance(body, dict) or body.get("status") in ("done", "failed"):
+            break
+        print(f"job {job_id}: {body.get('status')}...")
+        time.sleep(2)
+    if isinstance(body, dict) and body.get("status") == "done":
+        body["ok"] = True
+    return body
+
+
 def action_health(client: httpx.Client, base: str) -> None:
     code, body = req(client, "GET", f"{base}/health")
     print(f"HTTP {code}\n{_pretty(body)}")
@@ -101,6 +119,11 @@ def action_create_group(client: httpx.Client, base: str) -> None:
     code, body = req(client, "POST", f"{base}/api/crm/create_group", payload)
     print(f"HTTP {code}\n{_pretty(body)}")
 
+    # Группа создаётся в фоне — ждём завершения задачи
+    if isinstance(body, dict) and body.get("job_id"):
+        body = wait_job(client, base, body["job_id"])
+        print(f"Job result:\n{_pretty(body)}")
+
     # Подсказка для дальнейших шагов
     if isinstance(body, dict) and body.get("ok") and body.get("group_id"):
         print("\nСкопируй group_id для следующих тестов:")
@@ -130,6 +153,89 @@ def action_remove_contractor(client: httpx.Client, base: str) -> None:
     print(f"HTTP {code}\n{_pretty(body)}")
 
 
+# --- нагрузочный режим (--action load) ---
+
+LOAD_SCENARIOS = ["create_group", "send_fallback_message", "remove_contractor"]
+# только для TG_BACKEND=fake, в mixed не входят
+FAKE_SCENARIOS = ["fake_join"]
+
+
+def _loadgen():
+    # общая часть нагрузочного режима — services/scripts/loadgen.py (тестер запускается из репозитория)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+    import loadgen
+
+    return loadgen
+
+
+def _generate_scenarios(args) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    kinds = LOAD_SCENARIOS if args.scenario == "mixed" else [args.scenario]
+    run = time.strftime("%H%M%S")
+    contractors = args.contractor_ids or [111111111]
+    for i, kind in zip(range(args.requests), itertools.cycle(kinds)):
+        contractor_id = contractors[i % len(contractors)]
+        if kind == "create_group":
+            yield kind, {
+                "order_id": f"LOAD-{run}-{i}",
+                "title": f"Нагрузка {run}-{i}",
+                "description": None,
+                "icon_base64": None,
+                "curator_id": args.curator_id,
+                "curator_label": "Куратор",
+                "contractor_ids": [contractor_id],
+                "bot2_username": args.bot2_username,
+                "bot3_username": args.bot3_username,
+            }
+        elif kind == "send_fallback_message":
+            yield kind, {"contractor_id": contractor_id, "group_id": args.group_id, "text": f"Нагрузочный тест #{i}"}
+        elif kind == "fake_join":
+            yield kind, {"chat_id": args.group_id, "contractor_id": contractor_id}
+        else:
+            yield kind, {"chat_id": args.group_id, "contractor_id": contractor_id}
+
+
+async def _wait_job_async(client: "httpx.AsyncClient", base: str, job_id: str, timeout: float) -> Optional[str]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        r = await client.get(f"{base}/api/crm/jobs/{job_id}")
+        if r.status_code != 200:
+            return f"job HTTP {r.status_code}"
+        status = r.json().get("status")
+        if status == "done":
+            return None
+        if status == "failed":
+            return "job failed"
+        await asyncio.sleep(0.5)
+    return "job timeout"
+
+
+async def _load_one(
+    client: "httpx.AsyncClient", base: str, action: str, payload: Dict[str, Any], wait_jobs: bool, timeout: float
+) -> Optional[str]:
+    """Один запрос сценария; возвращает ключ ошибки для сводки или None."""
+    try:
+        r = await client.post(f"{base}/api/crm/{action}", json=payload)
+        if r.status_code >= 400:
+            return f"HTTP {r.status_code}"
+        body = r.json()
+        if not body.get("ok"):
+            # текст ошибки Telegram без хвоста с описанием — чтобы одинаковые ошибки сгруппировались
+            return f"{body.get('result_code')}: {(body.get('error') or '').split(' - ')[0][:80]}"
+        if wait_jobs and body.get("job_id"):
+            return await _wait_job_async(client, base, body["job_id"], timeout)
+        return None
+    except httpx.HTTPError as e:
+        return type(e).__name__
+
+
+def action_load(args) -> None:
+    async def send_one(client: "httpx.AsyncClient", action: str, payload: Dict[str, Any]) -> Optional[str]:
+        return await _load_one(client, args.base_url.rstrip("/"), action, payload, args.wait_jobs, args.job_timeout)
+
+    headers = {"X-CRM-API-Key": args.api_key} if args.api_key else None
+    _loadgen().main_load(args, _generate_scenarios, LOAD_SCENARIOS + FAKE_SCENARIOS, send_one, headers=headers)
+
+
 def interactive_menu() -> str:
     print("\nВыбери действие:")
     print("  1) health")
@@ -146,10 +252,32 @@ def interactive_menu() -> str:
 def main():
     ap = argparse.ArgumentParser(description="Console tester for Bot1 Userbot API")
     ap.add_argument("--base-url", default="http://127.0.0.1:8001", help="Bot1 base url, e.g. http://localhost:8001")
-    ap.add_argument("--action", choices=["health", "create_group", "send_fallback_message", "remove_contractor", "menu"],
-                    default="menu")
+    ap.add_argument("--action", choices=["health", "create_group", "send_fallback_message", "remove_contractor", "menu",
+                                         "load"], default="menu")
+    ap.add_argument("--api-key", default="", help="X-CRM-API-Key")
+
+    load = ap.add_argument_group("load", "нагрузочный режим: --action load")
+    load.add_argument("--scenario", choices=LOAD_SCENARIOS + FAKE_SCENARIOS + ["mixed"], default="send_fallback_message")
+    load.add_argument("--replay", help="JSONL со сценариями {action, payload} вместо генерации")
+    load.add_argument("--save-scenarios", help="записать сгенерированные сценарии в JSONL для повторного прогона")
+    load.add_argument("--requests", type=int, default=100, help="сколько запросов сгенерировать")
+    load.add_argument("--concurrency", type=int, default=10, help="максимум запросов в полёте")
+    load.add_argument("--rate", type=float, default=0.0, help="целевой темп, req/s (0 — без ограничения темпа)")
+    load.add_argument("--timeout", type=float, default=60.0)
+    load.add_argument("--wait-jobs", action="store_true", help="create_group: мерить до завершения задачи")
+    load.add_argument("--job-timeout", type=float, default=300.0)
+    load.add_argument("--curator-id", type=int, default=123456789)
+    load.add_argument("--contractor-ids", type=lambda s: [int(x) for x in s.split(",") if x], default=[])
+    load.add_argument("--group-id", type=int, default=-1001234567890, help="группа для fallback/remove")
+    load.add_argument("--bot2-username")
+    load.add_argument("--bot3-username")
+    load.add_argument("--json-out", help="куда записать отчёт в JSON; '-' — только JSON в stdout")
     args = ap.parse_args()
 
+    if args.action == "load":
+        action_load(args)
+        return
+
     base = args.base_url.rstrip("/")
 
     with httpx.Client() as client:
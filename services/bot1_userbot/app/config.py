@@ -1,3 +1,5 @@
+from typing import Dict, Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,8 +9,89 @@ class Settings(BaseSettings):
     tg_api_id: int
     tg_api_hash: str
     pyrogram_session_string: str
+    # Дополнительные аккаунты пула: {"имя": "session string"} (JSON). Основной аккаунт называется "main"
+    pyrogram_extra_sessions: Dict[str, str] = {}
+    # Сетевые ошибки / отозванная сессия выводят аккаунт из ротации: base * 2^n, не больше max
+    account_backoff_base_sec: float = 5
+    account_backoff_max_sec: float = 600
 
     bot1_db_path: str = "/data/bot1.sqlite"
+
+    # pyrogram — настоящий Telegram; fake — симулятор (app/fake_telegram.py) для нагрузочных тестов без сети
+    tg_backend: Literal["pyrogram", "fake"] = "pyrogram"
+    fake_tg_latency_ms: float = 50
+    fake_tg_jitter_ms: float = 30
+    fake_tg_flood_rate: float = 0.0
+    fake_tg_flood_wait_sec: int = 3
+    fake_tg_forbidden_rate: float = 0.0
+    fake_tg_seed: Optional[int] = None
+
+    # Прогрев при старте: CRM-запросы до готовности ждут ready_wait_sec, потом получают 503 с Retry-After
+    ready_wait_sec: float = 10
+    ready_retry_after_sec: float = 5
+    warmup_retry_sec: float = 15
+    # сколько последних peer'ов поднять из БД в память и сколько диалогов запросить у Telegram (0 — не запрашивать)
+    warmup_cached_peers: int = 2000
+    warmup_dialogs: int = 100
+
+    # Остановка: сколько ждать начатые операции (задачи, запросы); прерванные продолжатся после рестарта
+    shutdown_drain_sec: float = 20
+
+    # Фоновые воркеры очереди задач (create_group и т.п.)
+    job_workers: int = 2
+
+    # Пул заранее настроенных групп (0 — выключен). Используется, если боты в запросе совпадают с этими
+    spare_pool_size: int = 0
+    spare_bot2_username: str = ""
+    spare_bot3_username: str = ""
+    spare_pool_interval_sec: float = 60
+
+    # Fallback-сообщения, по которым исполнитель так и не вступил в группу, удаляются через ttl (0 — хранить вечно)
+    fallback_ttl_sec: float = 7 * 24 * 3600
+    fallback_sweep_interval_sec: float = 600
+    fallback_sweep_batch: int = 100
+
+    # Массовая fallback-рассылка: сколько сообщений в пачке (общий прогрев peer'ов; прогресс и запись
+    # для удаления ЛС сохраняются по каждому сообщению одной транзакцией)
+    fallback_bulk_batch: int = 20
+
+    # Кэш peer'ов (username/id -> access_hash), SQLite + LRU в памяти
+    peer_cache_ttl_sec: float = 24 * 3600
+    peer_cache_size: int = 10000
+
+    # Иконки групп: кэш обработанных картинок по хэшу (ресайз требует Pillow)
+    icon_cache_mb: float = 32
+    icon_max_side: int = 640
+    icon_jpeg_quality: int = 87
+
+    # Массовое отстранение: сколько киков выполнять параллельно (общий лимит — планировщик)
+    bulk_remove_concurrency: int = 4
+
+    # Детектор блокировок event loop'а: lag в /metrics, стек заблокировавшего кода — в лог
+    loop_monitor_enabled: bool = False
+    loop_monitor_interval_ms: float = 100
+    loop_monitor_threshold_ms: float = 250
+
+    # Шаги операций (create_group, remove_contractor, fallback DM) дольше порога пишутся в лог (0 — не писать)
+    slow_step_ms: int = 3000
+
+    # Настройка группы: сколько независимых шагов выполнять параллельно
+    group_setup_concurrency: int = 4
+
+    # Планировщик вызовов Telegram (app/scheduler.py)
+    tg_concurrency: int = 8
+    tg_default_rate: float = 5.0  # вызовов/сек на метод
+    tg_bucket_burst: float = 3.0
+    tg_method_rates: Dict[str, float] = {
+        "create_group": 0.2,
+        "add_chat_members": 1.0,
+        "promote_chat_member": 2.0,
+        "send_message": 1.0,
+        "resolve_peer": 0.5,
+        "export_chat_invite_link": 1.0,
+    }
+    # сколько максимум пережидаем FloodWait'ов по одному вызову, прежде чем вернуть ошибку
+    tg_flood_deadline_sec: float = 120
     log_level: str = "INFO"
 
 
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Tuple
+
+log = logging.getLogger("bot1.drain")
+
+
+class InflightOps:
+    """Операции с Telegram, которые выполняются прямо в HTTP-запросе (кик, fallback-ЛС).
+
+    При остановке их ждут до дедлайна; прерванная операция сохраняется задачей в очередь
+    (persist(kind, payload)) и выполнится после рестарта.
+    """
+
+    def __init__(self, persist: Callable[[str, Dict[str, Any]], str]):
+        self.persist = persist
+        self._ops: Dict[asyncio.Task, Tuple[str, Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    @contextmanager
+    def track(self, kind: str, payload: Dict[str, Any]):
+        task = asyncio.current_task()
+        self._ops[task] = (kind, payload)
+        try:
+            yield
+        except asyncio.CancelledError:
+            try:
+                job_id = self.persist(kind, payload)
+                log.warning("%s interrupted, saved as job %s", kind, job_id)
+            except Exception:
+                log.exception("Failed to persist interrupted %s %s", kind, payload)
+            raise
+        finally:
+            self._ops.pop(task, None)
+
+    async def drain(self, timeout: float) -> int:
+        """Ждёт операции до timeout секунд, оставшиеся отменяет (они сохранятся сами); возвращает число прерванных."""
+        tasks = list(self._ops)
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=max(0.0, timeout))
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return len(pending)
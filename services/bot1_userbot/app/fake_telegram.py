@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from pyrogram.errors import FloodWait, UserAlreadyParticipant, UserIsBlocked, UserPrivacyRestricted
+from pyrogram.raw import functions, types
+
+
+@dataclass
+class FakeOptions:
+    latency_ms: float = 50
+    jitter_ms: float = 30
+    # доля вызовов, на которые «Telegram» отвечает FloodWait'ом flood_wait_sec секунд
+    flood_rate: float = 0.0
+    flood_wait_sec: int = 3
+    # доля пользователей, которые запретили приглашения / заблокировали аккаунт
+    forbidden_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class _FakeChat:
+    id: int
+    title: str
+    members: Set[int] = field(default_factory=set)
+    # id -> текст (сервисные сообщения — с префиксом "service:")
+    messages: Dict[int, str] = field(default_factory=dict)
+
+
+class FakeWorld:
+    """Общее «состояние Telegram» для всех FakeClient'ов процесса (аккаунты пула видят одни и те же чаты)."""
+
+    def __init__(self, options: FakeOptions):
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.chats: Dict[int, _FakeChat] = {}
+        self._chat_ids = itertools.count(1_000_001)
+        self._message_ids = itertools.count(1)
+        self._user_ids = itertools.count(900_000_001)
+        self._usernames: Dict[str, int] = {}
+        self.clients: List["FakeClient"] = []
+        # ответ по пользователю фиксируется при первом обращении — «запретил» значит навсегда
+        self._forbidden: Dict[Any, bool] = {}
+
+    def next_user_id(self) -> int:
+        return next(self._user_ids)
+
+    def username_id(self, username: str) -> int:
+        if username not in self._usernames:
+            self._usernames[username] = self.next_user_id()
+        return self._usernames[username]
+
+    @staticmethod
+    def access_hash(peer_id: int) -> int:
+        return abs(peer_id) * 7919 % (1 << 62)
+
+    def forbidden(self, user: Any) -> bool:
+        if not isinstance(user, int):
+            # по username'у добавляются боты bot2/bot3 — им приглашения не запрещены
+            return False
+        if user not in self._forbidden:
+            self._forbidden[user] = self.rng.random() < self.options.forbidden_rate
+        return self._forbidden[user]
+
+    def new_chat(self, title: str, members: List[Any]) -> _FakeChat:
+        chat = _FakeChat(id=-next(self._chat_ids), title=title, members=set(members))
+        self.chats[chat.id] = chat
+        return chat
+
+    def chat(self, chat_id: int) -> _FakeChat:
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            # чаты, созданные «до запуска» (например, из БД прошлого прогона) — заводим на лету
+            chat = self.chats[chat_id] = _FakeChat(id=chat_id, title=str(chat_id))
+        return chat
+
+    def post(self, chat_id: int, text: str) -> int:
+        message_id = next(self._message_ids)
+        self.chat(chat_id).messages[message_id] = text
+        return message_id
+
+    async def join(self, chat_id: int, user_id: int) -> None:
+        """Подрядчик вступил по ссылке: обновление получает каждый аккаунт-участник чата, как от Telegram."""
+        chat = self.chat(chat_id)
+        chat.members.add(user_id)
+        update = SimpleNamespace(
+            chat=SimpleNamespace(id=chat_id),
+            new_chat_member=SimpleNamespace(user=SimpleNamespace(id=user_id)),
+        )
+        await asyncio.gather(
+            *(fn(c, update) for c in self.clients if c.me.id in chat.members for fn in c._member_handlers)
+        )
+
+
+_world: Optional[FakeWorld] = None
+
+
+def fake_world(options: FakeOptions) -> FakeWorld:
+    global _world
+    if _world is None:
+        _world = FakeWorld(options)
+    return _world
+
+
+@dataclass
+class _Done:
+    """Результат уже выполненного метода: как в pyrogram, высокоуровневые методы проходят через invoke,
+    и обёртки над ним (ServiceMessages) видят Updates с сервисными сообщениями."""
+
+    updates: Any
+
+
+class _FakeStorage:
+    # PeerCache.attach перехватывает storage.update_peers
+    async def update_peers(self, peers) -> None:
+        return None
+
+
+class FakeClient:
+    """Замена pyrogram.Client для нагрузочных тестов без сети (TG_BACKEND=fake).
+
+    Реализует только методы, которые вызывает бот1; каждый вызов ждёт latency±jitter
+    и с заданной вероятностью отвечает FloodWait. Пользователи из forbidden_rate
+    не добавляются в группы (UserPrivacyRestricted) и не получают ЛС (UserIsBlocked).
+    Как настоящий клиент, сохраняет peer'ы из ответов (storage.update_peers) и возвращает сервисные
+    сообщения через invoke; вступление по ссылке — simulate_join (POST /api/crm/fake_join).
+    """
+
+    def __init__(self, name: str, options: FakeOptions):
+        self.name = name
+        self.world = fake_world(options)
+        self.options = options
+        self.storage = _FakeStorage()
+        self.me = SimpleNamespace(id=self.world.next_user_id(), is_self=True)
+        self.is_connected = False
+        self._member_handlers: List[Callable] = []
+        self.world.clients.append(self)
+
+    async def _sim(self, method: str) -> None:
+        o = self.options
+        await asyncio.sleep((o.latency_ms + self.world.rng.uniform(0, o.jitter_ms)) / 1000)
+        if o.flood_rate and self.world.rng.random() < o.flood_rate:
+            raise FloodWait(value=o.flood_wait_sec)
+
+    # --- lifecycle / handlers ---
+
+    async def start(self) -> "FakeClient":
+        self.is_connected = True
+        return self
+
+    async def stop(self) -> "FakeClient":
+        self.is_connected = False
+        return self
+
+    async def get_me(self):
+        await self._sim("get_me")
+        return self.me
+
+    def on_chat_member_updated(self, *args, **kwargs):
+        def decorator(fn):
+            self._member_handlers.append(fn)
+            return fn
+
+        return decorator
+
+    async def simulate_join(self, chat_id: int, user_id: int) -> None:
+        await self.world.join(chat_id, user_id)
+
+    async def _service(self, chat_id: int, texts: List[str]) -> None:
+        """Постит сервисные сообщения и отдаёт их через invoke в виде Updates."""
+        updates = [
+            types.UpdateNewMessage(
+                message=types.MessageService(
+                    id=self.world.post(chat_id, f"service:{text}"),
+                    peer_id=types.PeerChat(chat_id=-chat_id),
+                    date=int(time.time()),
+                    action=types.MessageActionCustomAction(message=text),
+                ),
+                pts=0,
+                pts_count=1,
+            )
+            for text in texts
+        ]
+        await self.invoke(_Done(types.Updates(updates=updates, users=[], chats=[], date=int(time.time()), seq=0)))
+
+    async def _seen(self, peers: List[tuple]) -> None:
+        # pyrogram сохраняет peer'ы из каждого ответа — через storage.update_peers (его перехватывает PeerCache)
+        await self.storage.update_peers(peers)
+
+    async def invoke(self, query, *args, **kwargs):
+        if isinstance(query, _Done):
+            return query.updates
+        await self._sim("invoke")
+        if isinstance(query, functions.messages.DeleteChat):
+            self.world.chats.pop(-query.chat_id, None)
+        return True
+
+    async def resolve_peer(self, peer_id):
+        if isinstance(peer_id, int):
+            # id известны из хранилища — без обращения к Telegram
+            if peer_id < 0:
+                return types.InputPeerChat(chat_id=-peer_id)
+            return types.InputPeerUser(user_id=peer_id, access_hash=self.world.access_hash(peer_id))
+        await self._sim("resolve_peer")
+        username = peer_id.lstrip("@").lower()
+        user_id = self.world.username_id(username)
+        access_hash = self.world.access_hash(user_id)
+        await self._seen([(user_id, access_hash, "bot" if username.endswith("bot") else "user", username, None)])
+        return types.InputPeerUser(user_id=user_id, access_hash=access_hash)
+
+    # --- группы ---
+
+    async def create_group(self, title: str, users: List[Any]):
+        await self._sim("create_group")
+        chat = self.world.new_chat(title, [self.me.id, *users])
+        await self._seen(
+            [(chat.id, 0, "group", None, None)]
+            + [(u, self.world.access_hash(u), "user", None, None) for u in users if isinstance(u, int)]
+        )
+        await self._service(chat.id, ["create"])
+        return SimpleNamespace(id=chat.id, title=chat.title)
+
+    async def add_chat_members(self, chat_id: int, user_ids: Any, *args, **kwargs) -> bool:
+        await self._sim("add_chat_members")
+        users = user_ids if isinstance(user_ids, list) else [user_ids]
+        blocked = [u for u in users if self.world.forbidden(u)]
+        if blocked:
+            raise UserPrivacyRestricted()
+        chat = self.world.chat(chat_id)
+        # как AddChatUser в обычной группе: по одному, первый уже состоящий участник обрывает добавление
+        for u in users:
+            if u in chat.members:
+                raise UserAlreadyParticipant()
+            chat.members.add(u)
+            await self._service(chat_id, [f"add {u}"])
+        return True
+
+    async def promote_chat_member(self, chat_id: int, user_id: Any, *args, **kwargs) -> bool:
+        await self._sim("promote_chat_member")
+        await self._service(chat_id, [f"promote {user_id}"])
+        return True
+
+    async def set_administrator_title(self, chat_id: int, user_id: Any, title: str) -> bool:
+        await self._sim("set_administrator_title")
+        return True
+
+    async def set_chat_title(self, chat_id: int, title: str) -> bool:
+        await self._sim("set_chat_title")
+        self.world.chat(chat_id).title = title
+        await self._service(chat_id, ["title"])
+        return True
+
+    async def set_chat_description(self, chat_id: int, description: str) -> bool:
+        await self._sim("set_chat_description")
+        return True
+
+    async def set_chat_photo(self, chat_id: int, *, photo: Any = None, **kwargs) -> bool:
+        await self._sim("set_chat_photo")
+        await self._service(chat_id, ["photo"])
+        return True
+
+    async def get_chat_photos(self, chat_id: int, limit: int = 0):
+        await self._sim("get_chat_photos")
+        yield SimpleNamespace(file_id=f"fake-photo-{chat_id}")
+
+    async def get_dialogs(self, limit: int = 0):
+        await self._sim("get_dialogs")
+        chats = [c for c in self.world.chats.values() if self.me.id in c.members]
+        for chat in chats[: limit or None]:
+            yield SimpleNamespace(chat=SimpleNamespace(id=chat.id, title=chat.title))
+
+    async def get_chat_history(self, chat_id: int, limit: int = 0):
+        await self._sim("get_chat_history")
+        ids = sorted(self.world.chat(chat_id).messages, reverse=True)
+        for message_id in ids[: limit or None]:
+            yield SimpleNamespace(id=message_id)
+
+    async def delete_messages(self, chat_id: int, message_ids: Any, revoke: bool = True) -> int:
+        await self._sim("delete_messages")
+        ids = message_ids if isinstance(message_ids, list) else [message_ids]
+        messages = self.world.chat(chat_id).messages
+        return sum(messages.pop(i, None) is not None for i in ids)
+
+    async def export_chat_invite_link(self, chat_id: int) -> str:
+        await self._sim("export_chat_invite_link")
+        return f"https://t.me/+fake{abs(chat_id)}"
+
+    async def ban_chat_member(self, chat_id: int, user_id: Any, *args, **kwargs) -> bool:
+        await self._sim("ban_chat_member")
+        self.world.chat(chat_id).members.discard(user_id)
+        return True
+
+    async def unban_chat_member(self, chat_id: int, user_id: Any) -> bool:
+        await self._sim("unban_chat_member")
+        return True
+
+    # --- ЛС ---
+
+    async def send_message(self, chat_id: Any, text: str, *args, **kwargs):
+        await self._sim("send_message")
+        if self.world.forbidden(chat_id):
+            raise UserIsBlocked()
+        return SimpleNamespace(id=self.world.post(chat_id, text), chat=SimpleNamespace(id=chat_id))
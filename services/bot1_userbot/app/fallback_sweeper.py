@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from .scheduler import Priority
+from .storage import Storage
+from .telegram_client import TelegramUserbot
+
+log = logging.getLogger("bot1.fallback_sweeper")
+
+
+class FallbackSweeper:
+    """Фоново удаляет fallback-сообщения старше ttl_sec (исполнитель так и не вступил в группу)."""
+
+    def __init__(self, tg: TelegramUserbot, storage: Storage, ttl_sec: float, batch_size: int, interval_sec: float):
+        self.tg = tg
+        self.storage = storage
+        self.ttl_sec = ttl_sec
+        self.batch_size = batch_size
+        self.interval_sec = interval_sec
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                n = await self.sweep()
+                if n:
+                    log.info("Expired %s fallback message(s)", n)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Fallback sweep failed")
+            await asyncio.sleep(self.interval_sec)
+
+    async def sweep(self) -> int:
+        before = datetime.utcnow() - timedelta(seconds=self.ttl_sec)
+        total = 0
+        while True:
+            rows = await asyncio.to_thread(self.storage.get_expired_fallback_messages, before, self.batch_size)
+            if not rows:
+                return total
+            with self.tg.scheduler.lane(Priority.BACKGROUND):
+                await self.tg.purge_fallback_messages(rows)
+            total += len(rows)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict
+
+from .metrics import metrics
+
+try:  # Pillow необязателен: без него иконка загружается как есть
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+log = logging.getLogger("bot1.icons")
+
+
+@dataclass
+class Icon:
+    key: str  # sha256 исходных байт
+    data: bytes  # уже нормализованная картинка
+    # аккаунт -> file_id загруженного им фото (повторно используется без загрузки; у каждого аккаунта свой)
+    file_ids: Dict[str, str] = field(default_factory=dict)
+
+    def open(self) -> io.BytesIO:
+        f = io.BytesIO(self.data)
+        f.name = "icon.jpg"  # pyrogram берёт имя файла из .name
+        return f
+
+
+class IconCache:
+    """LRU обработанных иконок групп по хэшу содержимого, ограниченный суммарным размером в байтах.
+
+    CRM присылает одни и те же логотипы: декодирование, ресайз и перекодирование делаются один раз.
+    """
+
+    def __init__(self, max_bytes: int, max_side: int, jpeg_quality: int):
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self._items: "OrderedDict[str, Icon]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()  # get() вызывается из потоков (asyncio.to_thread)
+
+    def get(self, icon_base64: str) -> Icon:
+        """Синхронный (CPU): вызывать через asyncio.to_thread."""
+        raw = base64.b64decode(icon_base64)
+        key = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            icon = self._items.get(key)
+            if icon is not None:
+                self._items.move_to_end(key)
+                metrics.inc("bot1_icon_cache_hits_total")
+                return icon
+        metrics.inc("bot1_icon_cache_misses_total")
+        icon = Icon(key=key, data=self._normalize(raw))
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = icon
+                self._size += len(icon.data)
+                while self._size > self.max_bytes and len(self._items) > 1:
+                    _, old = self._items.popitem(last=False)
+                    self._size -= len(old.data)
+            metrics.set("bot1_icon_cache_bytes", self._size)
+            return self._items.get(key, icon)
+
+    def _normalize(self, raw: bytes) -> bytes:
+        # Telegram хранит фото чатов как JPEG до 640x640 — больше загружать бессмысленно
+        if Image is None:
+            return raw
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                img.thumbnail((self.max_side, self.max_side))
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                out = io.BytesIO()
+                img.save(out, format="JPEG", quality=self.jpeg_quality, optimize=True)
+        except Exception:
+            log.warning("Failed to normalize icon, uploading as is", exc_info=True)
+            return raw
+        data = out.getvalue()
+        # маленькую исходную картинку перекодирование может только увеличить
+        return data if len(data) < len(raw) else raw
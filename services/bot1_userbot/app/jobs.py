@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .storage import Job, Storage
+
+log = logging.getLogger("bot1.jobs")
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# задача, которую выполняет текущий воркер (для report/current_result из обработчика)
+_current: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("current_job", default=None)
+
+
+class JobFailed(Exception):
+    """Обработчик завершился ошибкой, но хочет сохранить частичный результат."""
+
+    def __init__(self, error: str, result: Dict[str, Any]):
+        super().__init__(error)
+        self.result = result
+
+
+class JobQueue:
+    """Очередь задач поверх таблицы jobs: переживает рестарт, выполняется N фоновыми воркерами."""
+
+    POLL_INTERVAL = 5.0
+
+    def __init__(self, storage: Storage, workers: int):
+        self.storage = storage
+        self.workers = workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], key: Optional[str] = None) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = self.storage.enqueue_job(kind, payload, key=key)
+        self._wakeup.set()
+        return job.id
+
+    def current_result(self) -> Optional[Dict[str, Any]]:
+        """Сохранённый прогресс текущей задачи — после рестарта обработчик продолжает с него."""
+        job = _current.get()
+        return json.loads(job.result) if job is not None and job.result else None
+
+    def current_id(self) -> Optional[str]:
+        job = _current.get()
+        return job.id if job is not None else None
+
+    def report(self, result: Dict[str, Any]) -> None:
+        """Сохраняет прогресс текущей задачи (виден в /api/crm/jobs/{job_id})."""
+        job = _current.get()
+        if job is None:
+            raise RuntimeError("report() called outside of a job")
+        self.storage.set_job_result(job.id, result)
+
+    def start(self) -> None:
+        n = self.storage.requeue_running_jobs()
+        if n:
+            log.info("Requeued %s interrupted jobs", n)
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Новые задачи не берём; выполняющиеся ждём до timeout секунд, остальные прерываем и возвращаем в очередь."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks and timeout > 0:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, n: int) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            job = self.storage.claim_next_job()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                self.storage.fail_job(job.id, f"Unknown job kind: {job.kind}")
+                continue
+
+            log.info("Worker %s: running job %s (%s, attempt %s)", n, job.id, job.kind, job.attempts)
+            token = _current.set(job)
+            try:
+                result = await handler(json.loads(job.payload))
+            except asyncio.CancelledError:
+                # прервана остановкой: прогресс (report) сохранён, после рестарта задача продолжится
+                self.storage.requeue_job(job.id)
+                log.warning("Job %s (%s) interrupted, requeued", job.id, job.kind)
+                raise
+            except JobFailed as e:
+                self.storage.fail_job(job.id, str(e), e.result)
+            except Exception as e:
+                log.exception("Job %s failed", job.id)
+                self.storage.fail_job(job.id, str(e))
+            else:
+                self.storage.finish_job(job.id, result)
+            finally:
+                _current.reset(token)
@@ -1,16 +1,36 @@
+import asyncio
+import functools
+import json
 import logging
+import threading
+import time
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from .config import settings
+from .metrics import metrics
 from .schemas import (
     CreateGroupRequest,
     CreateGroupResponse,
+    FakeJoinRequest,
+    JobResponse,
+    StepResultOut,
     RemoveContractorRequest,
+    RemoveContractorBulkRequest,
+    RemoveContractorResult,
     SendFallbackMessageRequest,
+    SendFallbackMessageBulkRequest,
     GenericResponse,
 )
+from .jobs import JobFailed, JobQueue
+from .drain import InflightOps
+from .fallback_sweeper import FallbackSweeper
+from .loop_monitor import LoopMonitor
+from .readiness import Readiness
+from .spare_pool import SparePool
 from .storage import Storage
 from .telegram_client import TelegramUserbot
 
@@ -19,18 +39,119 @@ log = logging.getLogger("bot1")
 
 storage = Storage(settings.bot1_db_path)
 tg = TelegramUserbot(storage=storage)
+jobs = JobQueue(storage, workers=settings.job_workers)
+spare_pool = SparePool(
+    tg,
+    storage,
+    size=settings.spare_pool_size,
+    bot2_username=settings.spare_bot2_username or None,
+    bot3_username=settings.spare_bot3_username or None,
+    interval_sec=settings.spare_pool_interval_sec,
+)
+# кики и fallback-ЛС из HTTP-запросов, прерванные остановкой, доделываются задачами после рестарта
+inflight = InflightOps(persist=lambda kind, payload: jobs.enqueue(kind, payload))
+fallback_sweeper = FallbackSweeper(
+    tg,
+    storage,
+    ttl_sec=settings.fallback_ttl_sec,
+    batch_size=settings.fallback_sweep_batch,
+    interval_sec=settings.fallback_sweep_interval_sec,
+)
+
+LOOP_LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _loop_sample(lag: float, blocked: bool) -> None:
+    metrics.observe("event_loop_lag_seconds", lag, buckets=LOOP_LAG_BUCKETS)
+    if blocked:
+        metrics.inc("event_loop_blocked_total")
+
+
+loop_monitor = (
+    LoopMonitor(
+        settings.loop_monitor_interval_ms / 1000,
+        settings.loop_monitor_threshold_ms,
+        logger="bot1.loop",
+        on_sample=_loop_sample,
+    )
+    if settings.loop_monitor_enabled
+    else None
+)
+readiness = Readiness(wait_sec=settings.ready_wait_sec, retry_after_sec=settings.ready_retry_after_sec)
 
 app = FastAPI(title="Bot1 Userbot API", version="1.0.0")
+app.middleware("http")(readiness.middleware)
+
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+async def _load_indexes() -> None:
+    n = await tg.load_fallback_index()
+    log.info("Fallback index loaded: %s pending contractor/group pairs", n)
+    n = await tg.load_chat_owners()
+    log.info("Chat owners loaded: %s chats", n)
+
+
+async def _prefetch_peers() -> None:
+    n = await tg.prefetch_peers(cached=settings.warmup_cached_peers, dialogs=settings.warmup_dialogs)
+    log.info("Prefetched %s peers/dialogs", n)
+
+
+async def _warm_up() -> None:
+    # Сервис отвечает на /health сразу; CRM-запросы пускаем, когда сессии подключены и кэши прогреты
+    while True:
+        try:
+            await readiness.run_phase("db_index", _load_indexes)
+            await readiness.run_phase("session_connect", tg.start)
+            await readiness.run_phase("peer_prefetch", _prefetch_peers)
+            break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            readiness.fail(e)
+            log.exception("Warm-up failed, retrying in %ss", settings.warmup_retry_sec)
+            await tg.stop()
+            await asyncio.sleep(settings.warmup_retry_sec)
+    jobs.start()
+    spare_pool.start()
+    fallback_sweeper.start()
+    readiness.mark_ready()
 
 
 @app.on_event("startup")
 async def _startup():
-    await tg.start()
+    global _warm_up_task
+    if loop_monitor:
+        loop_monitor.start()
+    _warm_up_task = asyncio.create_task(_warm_up())
 
 
 @app.on_event("shutdown")
 async def _shutdown():
+    # К этому моменту uvicorn уже отменил HTTP-запросы, не уложившиеся в --timeout-graceful-shutdown
+    # (InflightOps сохраняет их задачами — drain дожидается сохранения). Фоновую работу ждём до SHUTDOWN_DRAIN_SEC,
+    # недоделанное остаётся в очереди задач
+    readiness.begin_drain()
+    if _warm_up_task:
+        _warm_up_task.cancel()
+        await asyncio.gather(_warm_up_task, return_exceptions=True)
+    timeout = settings.shutdown_drain_sec
+    log.info("Draining: %s running job(s), %s in-flight request(s)", len(_create_inflight), len(inflight))
+    started = time.monotonic()
+    _, interrupted, _, _ = await asyncio.gather(
+        jobs.stop(timeout=timeout),
+        inflight.drain(timeout),
+        spare_pool.stop(timeout=timeout),
+        fallback_sweeper.stop(),
+    )
+    # create_group выполняется под shield — воркер уже прерван, обрываем и саму настройку (задача в очереди)
+    for task in list(_create_inflight.values()):
+        task.cancel()
+    await asyncio.gather(*_create_inflight.values(), return_exceptions=True)
+    log.info("Drained in %.1fs, %s request(s) saved as jobs", time.monotonic() - started, interrupted)
     await tg.stop()
+    if loop_monitor:
+        await loop_monitor.stop()
 
 
 @app.get("/health")
@@ -38,8 +159,44 @@ async def health():
     return {"ok": True}
 
 
-@app.post("/api/crm/create_group", response_model=CreateGroupResponse)
-async def create_group(req: CreateGroupRequest):
+@app.get("/ready")
+async def ready():
+    if not readiness.ready:
+        return readiness.not_ready_response()
+    return readiness.status()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    tg.export_metrics()
+    metrics.set("bot1_ready", int(readiness.ready))
+    if loop_monitor:
+        for q, v in loop_monitor.percentiles().items():
+            metrics.set("event_loop_lag_window_seconds", v, quantile=str(q))
+        metrics.set("event_loop_lag_window_seconds_max", max(loop_monitor.samples, default=0.0))
+    return PlainTextResponse(metrics.render())
+
+
+# order_id -> выполняющаяся настройка группы (single-flight внутри процесса)
+_create_inflight: Dict[str, asyncio.Task] = {}
+
+
+async def _run_create_group(payload: Dict[str, Any]) -> Dict[str, Any]:
+    req = CreateGroupRequest(**payload)
+    task = _create_inflight.get(req.order_id)
+    if task is None:
+        task = asyncio.create_task(_create_group_once(req))
+        _create_inflight[req.order_id] = task
+        task.add_done_callback(lambda _: _create_inflight.pop(req.order_id, None))
+    # shield: отмена одного ожидающего не должна обрывать общую задачу
+    return await asyncio.shield(task)
+
+
+async def _create_group_once(req: CreateGroupRequest) -> Dict[str, Any]:
+    existing = storage.get_order_group(req.order_id)
+    if existing and existing.status == "ready":
+        return {"group_id": existing.group_id, "group_link": existing.group_link, "steps": [], "reused": True}
+
     res = await tg.create_and_setup_group(
         title=req.title,
         description=req.description,
@@ -49,29 +206,218 @@ async def create_group(req: CreateGroupRequest):
         contractor_ids=req.contractor_ids,
         bot2_username=req.bot2_username,
         bot3_username=req.bot3_username,
+        # чат уже создан прошлой попыткой — только донастраиваем
+        chat_id=existing.group_id if existing else None,
+        from_spare=bool(existing and existing.from_spare),
+        on_created=lambda chat_id, from_spare: storage.save_order_group(
+            req.order_id, chat_id, None, status="creating", from_spare=from_spare
+        ),
     )
     if res.ok:
-        return CreateGroupResponse(ok=True, result_code="OK", group_id=res.group_id, group_link=res.group_link)
-    return CreateGroupResponse(ok=False, result_code="ERROR", error=res.error)
+        storage.save_order_group(req.order_id, res.group_id, res.group_link, status="ready")
+    result = {
+        "group_id": res.group_id,
+        "group_link": res.group_link,
+        "steps": [
+            {k: v for k, v in asdict(s).items() if k != "result"}
+            for s in res.steps
+        ],
+    }
+    if not res.ok:
+        raise JobFailed(res.error or "create_group failed", result)
+    return result
+
+
+jobs.register("create_group", _run_create_group)
+
+
+async def _run_fallback_bulk(payload: Dict[str, Any]) -> Dict[str, Any]:
+    items = payload["items"]
+    # после рестарта продолжаем с необработанных позиций; прогресс сохраняется после каждого сообщения,
+    # так что повторно уйти может только сообщение, отправленное в момент сбоя
+    progress = jobs.current_result() or {"total": len(items), "sent": 0, "failed": 0, "results": []}
+    done = {r.get("index", pos) for pos, r in enumerate(progress["results"])}
+    todo = [i for i in range(len(items)) if i not in done]
+    job_id = jobs.current_id()
+    progress_lock = threading.Lock()
+
+    def save(i: int, message_id: Optional[int], error: Optional[str], account: str) -> None:
+        it = items[i]
+        # под замком: снимки пишутся по порядку, более старый не перезапишет более новый
+        with progress_lock:
+            progress["sent" if error is None else "failed"] += 1
+            progress["results"].append(
+                {
+                    "index": i,
+                    "contractor_id": it["contractor_id"],
+                    "group_id": it["group_id"],
+                    "ok": error is None,
+                    "message_id": message_id,
+                    "error": error,
+                }
+            )
+            row = (it["contractor_id"], it["group_id"], message_id) if message_id is not None else None
+            storage.set_job_result_with_fallback(job_id, progress, row, account)
+
+    async def on_result(
+        batch: List[int], batch_pos: int, message_id: Optional[int], error: Optional[str], account: str
+    ) -> None:
+        # отметка «отправлено» и запись для удаления ЛС — одной транзакцией; запись уходит в поток до первого
+        # await, так что остановка задачи её не прерывает
+        await asyncio.to_thread(save, batch[batch_pos], message_id, error, account)
+
+    batch_size = max(1, settings.fallback_bulk_batch)
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start : start + batch_size]
+        await tg.send_fallback_messages(
+            [(items[i]["contractor_id"], items[i]["group_id"], items[i]["text"]) for i in batch],
+            on_result=functools.partial(on_result, batch),
+        )
+    return progress
+
+
+jobs.register("fallback_bulk", _run_fallback_bulk)
+
+
+@app.post("/api/crm/create_group", response_model=CreateGroupResponse)
+async def create_group(req: CreateGroupRequest):
+    # Идемпотентность по order_id: готовая группа отдаётся сразу, повтор во время создания — тот же job
+    existing = storage.get_order_group(req.order_id)
+    if existing and existing.status == "ready":
+        return CreateGroupResponse(
+            ok=True, result_code="OK", group_id=existing.group_id, group_link=existing.group_link
+        )
+    active = storage.find_active_job("create_group", req.order_id)
+    if active:
+        return CreateGroupResponse(ok=True, result_code="QUEUED", job_id=active.id)
+
+    # Настройка группы занимает десятки секунд — выполняем в фоне, CRM опрашивает /api/crm/jobs/{job_id}
+    job_id = jobs.enqueue("create_group", req.model_dump(), key=req.order_id)
+    return CreateGroupResponse(ok=True, result_code="QUEUED", job_id=job_id)
+
+
+@app.get("/api/crm/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    job = storage.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    result = json.loads(job.result) if job.result else None
+    return JobResponse(
+        job_id=job.id,
+        kind=job.kind,
+        status=job.status,
+        attempts=job.attempts,
+        group_id=(result or {}).get("group_id"),
+        group_link=(result or {}).get("group_link"),
+        steps=[StepResultOut(**st) for st in (result or {}).get("steps", [])],
+        result=result,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+async def _run_remove_contractor(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await tg.remove_contractor(chat_id=payload["chat_id"], contractor_id=payload["contractor_id"])
+    return {"ok": True}
+
+
+async def _run_fallback_dm(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await tg.send_fallback_message_and_track(**payload)
+    return {"ok": True}
+
+
+# операции из HTTP-запросов, прерванные остановкой сервиса (см. InflightOps)
+jobs.register("remove_contractor", _run_remove_contractor)
+jobs.register("fallback_dm", _run_fallback_dm)
 
 
 @app.post("/api/crm/remove_contractor", response_model=GenericResponse)
 async def remove_contractor(req: RemoveContractorRequest):
     try:
-        await tg.remove_contractor(chat_id=req.chat_id, contractor_id=req.contractor_id)
+        with inflight.track("remove_contractor", req.model_dump()):
+            await tg.remove_contractor(chat_id=req.chat_id, contractor_id=req.contractor_id)
         return GenericResponse(ok=True, result_code="OK")
     except Exception as e:
         return GenericResponse(ok=False, result_code="ERROR", error=str(e))
 
 
+async def _remove_many(pairs: List[Tuple[int, int]]) -> AsyncIterator[RemoveContractorResult]:
+    """Кики через пул из bulk_remove_concurrency воркеров; результаты — по мере готовности."""
+    todo: asyncio.Queue = asyncio.Queue()
+    for pair in pairs:
+        todo.put_nowait(pair)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while not todo.empty():
+            chat_id, contractor_id = todo.get_nowait()
+            try:
+                with inflight.track("remove_contractor", {"chat_id": chat_id, "contractor_id": contractor_id}):
+                    await tg.remove_contractor(chat_id=chat_id, contractor_id=contractor_id)
+                item = RemoveContractorResult(chat_id=chat_id, contractor_id=contractor_id, ok=True)
+            except Exception as e:
+                item = RemoveContractorResult(chat_id=chat_id, contractor_id=contractor_id, ok=False, error=str(e))
+            done.put_nowait(item)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(settings.bulk_remove_concurrency, len(pairs))))]
+    try:
+        for _ in pairs:
+            yield await done.get()
+    finally:
+        # клиент отключился — оставшиеся кики не начинаем
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+@app.post("/api/crm/remove_contractor/bulk")
+async def remove_contractor_bulk(req: RemoveContractorBulkRequest):
+    """NDJSON: строка RemoveContractorResult на каждую пару, последней — сводка {"done": true, ...}."""
+    pairs = [(i.chat_id, i.contractor_id) for i in req.items]
+    if req.contractor_id is not None:
+        pairs += [(chat_id, req.contractor_id) for chat_id in req.chat_ids]
+    elif req.chat_ids:
+        raise HTTPException(status_code=422, detail="chat_ids requires contractor_id")
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        raise HTTPException(status_code=422, detail="Nothing to remove")
+
+    async def body():
+        ok = 0
+        async for item in _remove_many(pairs):
+            ok += item.ok
+            yield item.model_dump_json() + "\n"
+        yield json.dumps({"done": True, "total": len(pairs), "ok": ok, "failed": len(pairs) - ok}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.post("/api/crm/send_fallback_message/bulk", response_model=GenericResponse)
+async def send_fallback_message_bulk(req: SendFallbackMessageBulkRequest):
+    # Сотни ЛС идут с темпом send_message из планировщика — в фоне; прогресс в /api/crm/jobs/{job_id}
+    job_id = jobs.enqueue("fallback_bulk", req.model_dump())
+    return GenericResponse(ok=True, result_code="QUEUED", job_id=job_id)
+
+
 @app.post("/api/crm/send_fallback_message", response_model=GenericResponse)
 async def send_fallback_message(req: SendFallbackMessageRequest):
     try:
-        await tg.send_fallback_message_and_track(
-            contractor_id=req.contractor_id,
-            group_id=req.group_id,
-            text=req.text,
-        )
+        with inflight.track("fallback_dm", req.model_dump()):
+            await tg.send_fallback_message_and_track(
+                contractor_id=req.contractor_id,
+                group_id=req.group_id,
+                text=req.text,
+            )
         return GenericResponse(ok=True, result_code="OK")
     except Exception as e:
         return GenericResponse(ok=False, result_code="ERROR", error=str(e))
+
+
+if settings.tg_backend == "fake":
+
+    @app.post("/api/crm/fake_join", response_model=GenericResponse)
+    async def fake_join(req: FakeJoinRequest):
+        # только для симулятора: подрядчик вступает по ссылке — срабатывают обработчики вступления (удаление ЛС)
+        await tg.main.client.simulate_join(req.chat_id, req.contractor_id)
+        return GenericResponse(ok=True, result_code="OK")
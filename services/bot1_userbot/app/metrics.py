@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# секунды: от быстрых вызовов Telegram до create_group с FloodWait'ами
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in key)
+    return "{" + inner + "}"
+
+
+class Metrics:
+    """Минимальный реестр метрик с выдачей в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        # name -> labels -> [счётчики по бакетам..., sum, count]
+        self._hists: Dict[str, Dict[LabelKey, List[float]]] = {}
+
+    def _series(self, name: str, kind: str) -> Dict[LabelKey, float]:
+        if name not in self._values:
+            self._types[name] = kind
+            self._values[name] = {}
+        return self._values[name]
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            series = self._series(name, "counter")
+            k = _key(labels)
+            series[k] = series.get(k, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._series(name, "gauge")[_key(labels)] = value
+
+    def set_max(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            series = self._series(name, "gauge")
+            k = _key(labels)
+            if value > series.get(k, float("-inf")):
+                series[k] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels) -> None:
+        with self._lock:
+            if name not in self._hists:
+                self._buckets[name] = buckets
+                self._hists[name] = {}
+            bounds = self._buckets[name]
+            k = _key(labels)
+            h = self._hists[name].get(k)
+            if h is None:
+                h = self._hists[name][k] = [0.0] * (len(bounds) + 2)
+            for i, le in enumerate(bounds):
+                if value <= le:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in self._values.items():
+                lines.append(f"# TYPE {name} {self._types[name]}")
+                for k, v in series.items():
+                    lines.append(f"{name}{_fmt_labels(k)} {v:g}")
+            for name, series in self._hists.items():
+                lines.append(f"# TYPE {name} histogram")
+                for k, h in series.items():
+                    for le, n in zip(self._buckets[name], h):
+                        lines.append(f"{name}_bucket{_fmt_labels(k + (('le', f'{le:g}'),))} {n:g}")
+                    lines.append(f"{name}_bucket{_fmt_labels(k + (('le', '+Inf'),))} {h[-1]:g}")
+                    lines.append(f"{name}_sum{_fmt_labels(k)} {h[-2]:g}")
+                    lines.append(f"{name}_count{_fmt_labels(k)} {h[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from .metrics import metrics
+from .storage import Storage
+
+log = logging.getLogger("bot1.peers")
+
+
+@dataclass
+class _Peer:
+    peer_id: int
+    access_hash: int
+    peer_type: str
+    username: Optional[str]
+    updated: float  # time.time()
+
+
+def _from_row(row) -> _Peer:
+    # updated_at хранится как naive UTC
+    updated = row.updated_at.replace(tzinfo=timezone.utc).timestamp()
+    return _Peer(row.peer_id, row.access_hash, row.peer_type, row.username, updated)
+
+
+class PeerCache:
+    """Кэш peer'ов аккаунта: LRU в памяти поверх таблицы account_peers.
+
+    Наполняется всем, что pyrogram сохраняет в своё хранилище (ответы любых вызовов),
+    и перед вызовами подкладывает известные peer'ы обратно в хранилище pyrogram — так
+    resolve_peer внутри методов pyrogram не ходит в Telegram (contacts.ResolveUsername
+    один из самых жёстко лимитированных методов).
+    Соответствие username -> id обновляется, если старше ttl_sec.
+    Запросы к SQLite — вне event loop'а: промахи читаются в потоке, изменения пишет фоновая задача пачками.
+    """
+
+    def __init__(self, storage: Storage, account: str, ttl_sec: float, max_size: int):
+        self.storage = storage
+        self.account = account
+        self.ttl_sec = ttl_sec
+        self.max_size = max_size
+        self._by_id: "OrderedDict[int, _Peer]" = OrderedDict()
+        self._by_username: dict = {}
+        self._client = None
+        self._update_peers = None
+        # peer_id -> строка для upsert, ещё не записанная в БД
+        self._dirty: Dict[int, Tuple[int, int, str, Optional[str]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def attach(self, client) -> None:
+        """Перехватывает storage.update_peers клиента pyrogram (хранилище создаётся в Client.__init__)."""
+        self._client = client
+        original = client.storage.update_peers
+        self._update_peers = original
+
+        async def update_peers(peers):
+            await original(peers)
+            self.remember(peers)
+
+        client.storage.update_peers = update_peers
+
+    def remember(self, peers: Iterable[Tuple[int, int, str, Optional[str], Optional[str]]]) -> None:
+        now = time.time()
+        for peer_id, access_hash, peer_type, username, _phone in peers:
+            old = self._by_id.get(peer_id)
+            fresh = old and now - old.updated < self.ttl_sec / 2
+            if fresh and old.access_hash == access_hash and old.username == username:
+                continue
+            self._put(_Peer(peer_id, access_hash, peer_type, username, now))
+            self._dirty[peer_id] = (peer_id, access_hash, peer_type, username)
+        if self._dirty and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        # один писатель: пачки уходят в БД по порядку, пока копятся новые изменения
+        try:
+            while self._dirty:
+                batch, self._dirty = list(self._dirty.values()), {}
+                try:
+                    await asyncio.to_thread(self.storage.upsert_peers, self.account, batch)
+                except Exception:
+                    log.exception("Failed persisting %s peers", len(batch))
+        finally:
+            self._flush_task = None
+
+    async def flush(self) -> None:
+        """Дожидается записи накопленных изменений (при остановке)."""
+        if self._flush_task:
+            await asyncio.shield(self._flush_task)
+
+    async def preload(self, limit: int) -> int:
+        """Прогрев LRU последними обновлёнными peer'ами из БД."""
+        # читаем в потоке, а LRU меняем только в loop'е — клиент уже запущен и сам наполняет кэш
+        rows = await asyncio.to_thread(self.storage.get_recent_peers, self.account, min(limit, self.max_size))
+        # самые свежие кладём последними — они окажутся в «горячем» конце LRU
+        for row in reversed(rows):
+            self._put(_from_row(row))
+        return len(rows)
+
+    def _put(self, p: _Peer) -> None:
+        self._by_id[p.peer_id] = p
+        self._by_id.move_to_end(p.peer_id)
+        if p.username:
+            self._by_username[p.username] = p.peer_id
+        while len(self._by_id) > self.max_size:
+            _, evicted = self._by_id.popitem(last=False)
+            if evicted.username and self._by_username.get(evicted.username) == evicted.peer_id:
+                del self._by_username[evicted.username]
+
+    async def _lookup(self, ref: Union[int, str]) -> Optional[_Peer]:
+        if isinstance(ref, str):
+            username = ref.lstrip("@").lower()
+            peer_id = self._by_username.get(username)
+            p = self._by_id.get(peer_id) if peer_id is not None else None
+            if p is None:
+                row = await asyncio.to_thread(self.storage.get_peer_by_username, self.account, username)
+                if row:
+                    p = _from_row(row)
+                    self._put(p)
+            return p
+
+        p = self._by_id.get(ref)
+        if p is None:
+            row = await asyncio.to_thread(self.storage.get_peer, self.account, ref)
+            if row:
+                p = _from_row(row)
+                self._put(p)
+        else:
+            self._by_id.move_to_end(ref)
+        return p
+
+    async def ensure(self, refs: Iterable[Union[int, str, None]], resolve) -> None:
+        """Гарантирует, что peer'ы есть в хранилище pyrogram.
+
+        Известные и свежие — подкладываются из кэша без сети; неизвестные username'ы (или
+        устаревшие) резолвятся через resolve (вызов планировщика), результат попадёт в кэш сам.
+        """
+        to_push = []
+        for ref in refs:
+            if ref is None or ref == "":
+                continue
+            p = await self._lookup(ref)
+            expired = p is not None and isinstance(ref, str) and time.time() - p.updated > self.ttl_sec
+            if p is not None and not expired:
+                metrics.inc("peer_cache_total", result="hit")
+                # для pyrogram username должен выглядеть свежим (USERNAME_TTL) — отдаём с текущим временем
+                to_push.append((p.peer_id, p.access_hash, p.peer_type, p.username, None))
+                continue
+            metrics.inc("peer_cache_total", result="expired" if expired else "miss")
+            if isinstance(ref, str):
+                try:
+                    await resolve(ref)
+                except Exception as e:
+                    log.warning("Failed resolving %s: %s", ref, e)
+        if to_push and self._update_peers:
+            await self._update_peers(to_push)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from .metrics import metrics
+
+log = logging.getLogger("bot1.readiness")
+
+
+class Readiness:
+    """Готовность принимать CRM-запросы.
+
+    Прогрев (сессии Telegram, кэши) идёт в фоне по фазам; до его окончания запросы к /api/
+    ждут до wait_sec, а потом получают 503 с Retry-After. Длительность фаз — в лог и метрики.
+    """
+
+    def __init__(self, wait_sec: float, retry_after_sec: float):
+        self.wait_sec = wait_sec
+        self.retry_after_sec = retry_after_sec
+        self.ready = False
+        self.draining = False
+        self.phase: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._started = time.monotonic()
+        self._event = asyncio.Event()
+
+    async def run_phase(self, name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.phase = name
+        started = time.monotonic()
+        ok = False
+        try:
+            result = await fn()
+            ok = True
+            return result
+        finally:
+            elapsed = time.monotonic() - started
+            self.phases[name] = elapsed
+            metrics.set("bot1_startup_phase_seconds", elapsed, phase=name)
+            log.info("Startup phase %s %s in %.0fms", name, "done" if ok else "failed", elapsed * 1000)
+
+    def begin_drain(self) -> None:
+        # остановка: новые CRM-запросы сразу получают 503, балансировщик уводит трафик
+        self.ready = False
+        self.draining = True
+        self._event.clear()
+
+    def fail(self, error: BaseException) -> None:
+        self.error = repr(error)
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.phase = None
+        self.error = None
+        self._event.set()
+        log.info(
+            "Ready in %.0fms (%s)",
+            (time.monotonic() - self._started) * 1000,
+            ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.phases.items()),
+        )
+
+    async def wait(self, timeout: float) -> bool:
+        if self.ready:
+            return True
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "phase": self.phase,
+            "phases_ms": {k: round(v * 1000) for k, v in self.phases.items()},
+            "error": self.error,
+        }
+
+    def not_ready_response(self) -> JSONResponse:
+        return JSONResponse(
+            status_code=503,
+            content=self.status(),
+            headers={"Retry-After": str(max(1, math.ceil(self.retry_after_sec)))},
+        )
+
+    async def middleware(self, request: Request, call_next):
+        # health/ready/metrics/docs отвечают всегда; CRM-запросы — только после прогрева
+        if self.ready or not request.url.path.startswith("/api/"):
+            return await call_next(request)
+        if self.draining or not await self.wait(self.wait_sec):
+            return self.not_ready_response()
+        return await call_next(request)
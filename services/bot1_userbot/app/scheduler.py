@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pyrogram.errors import FloodWait
+
+from .metrics import metrics
+
+log = logging.getLogger("bot1.scheduler")
+
+
+class Priority(IntEnum):
+    # меньше — важнее
+    KICK = 0
+    CREATE_GROUP = 1
+    DEFAULT = 2
+    FALLBACK_DM = 3
+    BACKGROUND = 4
+
+
+_lane: contextvars.ContextVar[Priority] = contextvars.ContextVar("tg_lane", default=Priority.DEFAULT)
+
+
+class _Bucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # до этого момента метод заблокирован FloodWait'ом
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        """Резервирует токен; возвращает, сколько секунд подождать перед вызовом."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+
+class _PrioritySlots:
+    """Семафор, который при освобождении слота будит ожидающего с наивысшим приоритетом."""
+
+    def __init__(self, capacity: int):
+        self.free = capacity
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self.depth: Dict[Priority, int] = {p: 0 for p in Priority}
+
+    async def acquire(self, priority: Priority) -> None:
+        if self.free > 0 and not self._waiters:
+            self.free -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), fut))
+        self.depth[priority] += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # слот уже был отдан нам — возвращаем
+                self.release()
+            raise
+        finally:
+            self.depth[priority] -= 1
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.free += 1
+
+
+class TelegramScheduler:
+    """Единая точка вызова методов pyrogram.Client.
+
+    - token bucket на каждый метод (TG_METHOD_RATES / TG_DEFAULT_RATE);
+    - общий лимит одновременных вызовов с приоритетными полосами (kick > create_group > default > fallback DM > фоновые);
+    - FloodWait: метод блокируется на указанное время, вызов повторяется, пока укладывается в deadline.
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency: int,
+        default_rate: float,
+        method_rates: Dict[str, float],
+        burst: float,
+        flood_deadline_sec: float,
+        account: str = "main",
+        on_error: Optional[Callable[[Optional[BaseException]], None]] = None,
+    ):
+        self.client = client
+        self.account = account
+        # итог каждого вызова (None — успех): по нему аккаунт пула следит за своим здоровьем
+        self.on_error = on_error
+        # вызовы в очереди и в работе — мера загрузки аккаунта
+        self.pending = 0
+        self.default_rate = default_rate
+        self.method_rates = method_rates
+        self.burst = burst
+        self.flood_deadline_sec = flood_deadline_sec
+        self._slots = _PrioritySlots(concurrency)
+        self._buckets: Dict[str, _Bucket] = {}
+
+    @contextmanager
+    def lane(self, priority: Priority):
+        token = _lane.set(priority)
+        try:
+            yield
+        finally:
+            _lane.reset(token)
+
+    def blocked_for(self, method: str) -> float:
+        """Сколько ещё секунд метод заблокирован FloodWait'ом."""
+        b = self._buckets.get(method)
+        return max(0.0, b.blocked_until - time.monotonic()) if b else 0.0
+
+    def _bucket(self, method: str) -> _Bucket:
+        b = self._buckets.get(method)
+        if b is None:
+            b = self._buckets[method] = _Bucket(self.method_rates.get(method, self.default_rate), self.burst)
+        return b
+
+    async def call(self, method: str, *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        return await self._run(method, lambda: getattr(self.client, method)(*args, **kwargs), deadline)
+
+    async def collect(self, method: str, *args, deadline: Optional[float] = None, **kwargs) -> list:
+        """Для методов-генераторов (get_chat_history и т.п.): выполняет их целиком под планировщиком."""
+
+        async def _gen():
+            return [x async for x in getattr(self.client, method)(*args, **kwargs)]
+
+        return await self._run(method, _gen, deadline)
+
+    async def _run(self, method: str, make_call: Callable[[], Awaitable[Any]], deadline: Optional[float]) -> Any:
+        self.pending += 1
+        try:
+            result = await self._run_with_retries(method, make_call, deadline)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+            raise
+        finally:
+            self.pending -= 1
+        if self.on_error:
+            self.on_error(None)
+        return result
+
+    async def _run_with_retries(
+        self, method: str, make_call: Callable[[], Awaitable[Any]], deadline: Optional[float]
+    ) -> Any:
+        priority = _lane.get()
+        lane = priority.name.lower()
+        deadline_at = time.monotonic() + (self.flood_deadline_sec if deadline is None else deadline)
+
+        while True:
+            queued_at = time.monotonic()
+            # Сначала ждём токен метода (и окончания FloodWait), потом — слот в своей полосе
+            wait = self._bucket(method).reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._slots.acquire(priority)
+            flood_error: Optional[FloodWait] = None
+            try:
+                waited = time.monotonic() - queued_at
+                metrics.inc("tg_scheduler_wait_seconds_sum", waited, lane=lane, account=self.account)
+                metrics.inc("tg_scheduler_wait_seconds_count", lane=lane, account=self.account)
+                metrics.set_max("tg_scheduler_wait_seconds_max", waited, lane=lane, account=self.account)
+                try:
+                    result = await self._timed(method, make_call)
+                except FloodWait as e:
+                    flood_error = e
+                    self._bucket(method).blocked_until = time.monotonic() + float(e.value or 0)
+                    metrics.inc("tg_calls_total", method=method, status="flood_wait", account=self.account)
+                    metrics.inc(
+                        "tg_flood_wait_seconds_total", float(e.value or 0), method=method, account=self.account
+                    )
+                except Exception:
+                    metrics.inc("tg_calls_total", method=method, status="error", account=self.account)
+                    raise
+                else:
+                    metrics.inc("tg_calls_total", method=method, status="ok", account=self.account)
+                    return result
+            finally:
+                self._slots.release()
+
+            flood = float(flood_error.value or 0)
+            if time.monotonic() + flood > deadline_at:
+                log.warning("%s: FloodWait %ss exceeds deadline, giving up", method, flood)
+                raise flood_error
+            # повтор: reserve() на следующей итерации дождётся конца блокировки метода
+            log.info("%s: FloodWait %ss, retrying (lane=%s)", method, flood, lane)
+
+    async def _timed(self, method: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        # время самого вызова Telegram, без ожидания токена и слота
+        started = time.monotonic()
+        try:
+            return await make_call()
+        finally:
+            metrics.observe("tg_call_seconds", time.monotonic() - started, method=method, account=self.account)
+
+    def export_metrics(self) -> None:
+        for p, depth in self._slots.depth.items():
+            metrics.set("tg_scheduler_queue_depth", depth, lane=p.name.lower(), account=self.account)
+        metrics.set("tg_scheduler_free_slots", self._slots.free, account=self.account)
+        metrics.set("tg_scheduler_pending", self.pending, account=self.account)
@@ -1,5 +1,7 @@
+from datetime import datetime
+
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class CreateGroupRequest(BaseModel):
@@ -17,12 +19,36 @@ class CreateGroupRequest(BaseModel):
     bot3_username: Optional[str] = None
 
 
+class StepResultOut(BaseModel):
+    name: str
+    ok: bool
+    duration_ms: int
+    skipped: bool = False
+    error: Optional[str] = None
+
+
 class CreateGroupResponse(BaseModel):
     ok: bool
     result_code: str
     group_id: Optional[int] = None
     group_link: Optional[str] = None
     error: Optional[str] = None
+    job_id: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    # queued | running | done | failed
+    status: str
+    attempts: int
+    group_id: Optional[int] = None
+    group_link: Optional[str] = None
+    steps: List[StepResultOut] = Field(default_factory=list)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 
 class RemoveContractorRequest(BaseModel):
@@ -30,13 +56,37 @@ class RemoveContractorRequest(BaseModel):
     contractor_id: int
 
 
+class RemoveContractorBulkRequest(BaseModel):
+    # либо явные пары, либо один подрядчик и все его чаты (можно вместе)
+    items: List[RemoveContractorRequest] = Field(default_factory=list)
+    contractor_id: Optional[int] = None
+    chat_ids: List[int] = Field(default_factory=list)
+
+
+class RemoveContractorResult(BaseModel):
+    chat_id: int
+    contractor_id: int
+    ok: bool
+    error: Optional[str] = None
+
+
+class FakeJoinRequest(BaseModel):
+    chat_id: int
+    contractor_id: int
+
+
 class SendFallbackMessageRequest(BaseModel):
     contractor_id: int
     group_id: int
     text: str
 
 
+class SendFallbackMessageBulkRequest(BaseModel):
+    items: List[SendFallbackMessageRequest] = Field(min_length=1)
+
+
 class GenericResponse(BaseModel):
     ok: bool
     result_code: str
     error: Optional[str] = None
+    job_id: Optional[str] = None
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+from pyrogram import raw, utils
+
+# chat_id -> id сервисных сообщений, пойманных внутри ServiceMessages.collect()
+_found: contextvars.ContextVar[Optional[Dict[int, Set[int]]]] = contextvars.ContextVar("service_messages", default=None)
+
+
+class ServiceMessages:
+    """Ловит id сервисных сообщений («X добавил Y», «фото изменено» и т.п.) в ответах Telegram.
+
+    Почти все методы настройки группы возвращают Updates с порождённым MessageService;
+    обёртка над client.invoke складывает их id, пока активен collect(). Контекст наследуется
+    задачами asyncio, поэтому шаги run_steps пишут в тот же словарь.
+    """
+
+    def attach(self, client) -> None:
+        original = client.invoke
+
+        async def invoke(query, *args, **kwargs):
+            result = await original(query, *args, **kwargs)
+            found = _found.get()
+            if found is not None:
+                _extract(result, found)
+            return result
+
+        client.invoke = invoke
+
+    @contextmanager
+    def collect(self) -> Iterator[Dict[int, Set[int]]]:
+        found: Dict[int, Set[int]] = {}
+        token = _found.set(found)
+        try:
+            yield found
+        finally:
+            _found.reset(token)
+
+
+def _extract(result, found: Dict[int, Set[int]]) -> None:
+    if isinstance(result, raw.types.UpdateShort):
+        updates = [result.update]
+    else:
+        updates = getattr(result, "updates", None)
+        if updates is not None and not isinstance(updates, list):
+            # обёртки вида messages.InvitedUsers(updates=Updates)
+            _extract(updates, found)
+            return
+    for u in updates or ():
+        if isinstance(u, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)) and isinstance(
+            u.message, raw.types.MessageService
+        ):
+            found.setdefault(utils.get_peer_id(u.message.peer_id), set()).add(u.message.id)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from .config import settings
+from .metrics import metrics
+
+log = logging.getLogger("bot1.spans")
+
+
+def observe_step(op: str, step: str, seconds: float, ok: bool) -> None:
+    """Гистограмма bot1_step_seconds{op,step,status} + лог шагов медленнее SLOW_STEP_MS."""
+    metrics.observe("bot1_step_seconds", seconds, op=op, step=step, status="ok" if ok else "error")
+    if settings.slow_step_ms and seconds * 1000 >= settings.slow_step_ms:
+        log.warning("Slow step %s/%s: %.0fms (%s)", op, step, seconds * 1000, "ok" if ok else "error")
+
+
+@contextmanager
+def span(op: str, step: str) -> Iterator[None]:
+    """Замер шага операции (работает и вокруг await)."""
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe_step(op, step, time.perf_counter() - started, ok)
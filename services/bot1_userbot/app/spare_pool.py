@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Optional
+
+from .storage import Storage
+from .telegram_client import TelegramUserbot
+
+log = logging.getLogger("bot1.spare_pool")
+
+
+class SparePool:
+    """Фоново поддерживает size готовых групп с ботами bot2/bot3 (см. TelegramUserbot.create_spare_group)."""
+
+    def __init__(
+        self,
+        tg: TelegramUserbot,
+        storage: Storage,
+        size: int,
+        bot2_username: Optional[str],
+        bot3_username: Optional[str],
+        interval_sec: float,
+    ):
+        self.tg = tg
+        self.storage = storage
+        self.size = size
+        self.bot2_username = bot2_username
+        self.bot3_username = bot3_username
+        self.interval_sec = interval_sec
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._refilling = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and bool(self.bot2_username or self.bot3_username)
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Новые группы не создаём; создаваемую даём достроить до timeout секунд, иначе она останется вне пула."""
+        if self._task:
+            self._stopping = True
+            if self._refilling and timeout > 0:
+                await asyncio.wait({self._task}, timeout=timeout)
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            self._refilling = True
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Spare pool refill failed")
+            finally:
+                self._refilling = False
+            if not self._stopping:
+                await asyncio.sleep(self.interval_sec)
+
+    async def refill(self) -> None:
+        missing = self.size - self.storage.count_spare_groups(self.bot2_username, self.bot3_username)
+        for _ in range(max(missing, 0)):
+            if self._stopping:
+                return
+            chat_id = await self.tg.create_spare_group(self.bot2_username, self.bot3_username)
+            self.storage.add_spare_group(chat_id, self.bot2_username, self.bot3_username)
+            log.info("Spare group %s added to pool", chat_id)
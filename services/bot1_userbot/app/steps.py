@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pyrogram.errors import FloodWait
+
+from .spans import observe_step
+
+log = logging.getLogger("bot1.steps")
+
+
+@dataclass
+class Step:
+    name: str
+    fn: Callable[[], Awaitable[Any]]
+    # шаги, которые должны завершиться до запуска этого
+    deps: Tuple[str, ...] = ()
+    # пропустить шаг, если хотя бы одна зависимость упала
+    requires_ok: bool = False
+
+
+@dataclass
+class StepResult:
+    name: str
+    ok: bool
+    duration_ms: int = 0
+    error: Optional[str] = None
+    skipped: bool = False
+    result: Any = field(default=None, repr=False)
+
+
+async def run_steps(steps: List[Step], concurrency: int, op: Optional[str] = None) -> Dict[str, StepResult]:
+    """Выполняет граф шагов: независимые шаги идут параллельно (не более concurrency одновременно).
+
+    op — имя операции для гистограммы длительностей шагов (см. spans.observe_step).
+
+    FloodWait внутри шагов обрабатывает TelegramScheduler; сюда он доходит, только если не уложился в deadline.
+    """
+    by_name = {s.name: s for s in steps}
+    for s in steps:
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"Step {s.name} depends on unknown step {d}")
+
+    sem = asyncio.Semaphore(concurrency)
+    tasks: Dict[str, asyncio.Task] = {}
+    results: Dict[str, StepResult] = {}
+
+    async def _run(step: Step) -> StepResult:
+        if step.deps:
+            await asyncio.gather(*(tasks[d] for d in step.deps))
+        if step.requires_ok and not all(results[d].ok for d in step.deps):
+            res = StepResult(name=step.name, ok=False, skipped=True, error="dependency failed")
+            results[step.name] = res
+            return res
+
+        started = time.perf_counter()
+        try:
+            async with sem:
+                value = await step.fn()
+            res = StepResult(name=step.name, ok=True, result=value)
+        except FloodWait as e:
+            log.warning("Step %s: FloodWait %ss, giving up", step.name, e.value)
+            res = StepResult(name=step.name, ok=False, error=f"FloodWait {e.value}s")
+        except Exception as e:
+            log.warning("Step %s failed: %s", step.name, e)
+            res = StepResult(name=step.name, ok=False, error=str(e))
+        elapsed = time.perf_counter() - started
+        res.duration_ms = int(elapsed * 1000)
+        if op:
+            observe_step(op, step.name, elapsed, res.ok)
+        results[step.name] = res
+        return res
+
+    # Сортировка нужна только для проверки циклов: задачи начнут выполняться, когда все уже созданы
+    for s in _toposort(steps):
+        tasks[s.name] = asyncio.create_task(_run(s))
+    await asyncio.gather(*tasks.values())
+    return {s.name: results[s.name] for s in steps}
+
+
+def _toposort(steps: List[Step]) -> List[Step]:
+    by_name = {s.name: s for s in steps}
+    out: List[Step] = []
+    state: Dict[str, int] = {}
+
+    def visit(s: Step) -> None:
+        mark = state.get(s.name)
+        if mark == 2:
+            return
+        if mark == 1:
+            raise ValueError(f"Dependency cycle at step {s.name}")
+        state[s.name] = 1
+        for d in s.deps:
+            visit(by_name[d])
+        state[s.name] = 2
+        out.append(s)
+
+    for s in steps:
+        visit(s)
+    return out
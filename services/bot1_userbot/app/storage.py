@@ -1,10 +1,27 @@
 from __future__ import annotations
 
+import json
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import create_engine, Integer, DateTime, select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import (
+    create_engine,
+    inspect,
+    text,
+    Boolean,
+    Index,
+    Integer,
+    DateTime,
+    String,
+    Text,
+    select,
+    delete,
+    func,
+    update,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session
 
 
@@ -14,14 +31,93 @@ class Base(DeclarativeBase):
 
 class FallbackMessage(Base):
     __tablename__ = "fallback_messages"
+    __table_args__ = (Index("ix_fallback_pair", "contractor_id", "group_id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     contractor_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
     group_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
     message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # аккаунт пула, отправивший сообщение (удалить может только он); NULL — основной
+    account: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True, nullable=False)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    # ключ идемпотентности (для create_group — order_id)
+    key: Mapped[Optional[str]] = mapped_column(String(128), index=True, nullable=True)
+    # queued -> running -> done | failed
+    status: Mapped[str] = mapped_column(String(16), index=True, nullable=False, default="queued")
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    result: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class OrderGroup(Base):
+    """order_id -> созданная под него группа (для идемпотентного create_group)."""
+
+    __tablename__ = "order_groups"
+
+    order_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    group_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    group_link: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # creating — чат создан, настройка не завершена; ready — можно отдавать как есть
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="creating")
+    # чат взят из пула заготовок — при повторе настройки боты уже в нём, куратора нужно добавить
+    from_spare: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SpareGroup(Base):
+    """Заранее созданная и настроенная группа (пул для быстрого create_group)."""
+
+    __tablename__ = "spare_groups"
+
+    chat_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bot2_username: Mapped[str] = mapped_column(String(64), nullable=False, default="")
+    bot3_username: Mapped[str] = mapped_column(String(64), nullable=False, default="")
+    # ready | claimed
+    status: Mapped[str] = mapped_column(String(16), index=True, nullable=False, default="ready")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
 
+class ChatAccount(Base):
+    """Какой аккаунт пула создал группу (и только он может её администрировать)."""
+
+    __tablename__ = "chat_accounts"
+
+    chat_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    account: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+def _norm_username(username: Optional[str]) -> str:
+    return (username or "").lstrip("@").lower()
+
+
+class PeerEntry(Base):
+    """Персистентный кэш peer'ов Telegram (id -> access_hash), чтобы не резолвить username'ы заново.
+
+    access_hash у каждого аккаунта свой, поэтому ключ — (account, peer_id).
+    """
+
+    __tablename__ = "account_peers"
+
+    account: Mapped[str] = mapped_column(String(64), primary_key=True)
+    peer_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    access_hash: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    peer_type: Mapped[str] = mapped_column(String(16), nullable=False)
+    username: Mapped[Optional[str]] = mapped_column(String(64), index=True, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Storage:
     def __init__(self, sqlite_path: str):
         p = Path(sqlite_path)
@@ -32,21 +128,287 @@ class Storage:
         abs_path = p.resolve().as_posix()
         self.engine = create_engine(f"sqlite:///{abs_path}", connect_args={"check_same_thread": False})
         Base.metadata.create_all(self.engine)
+        self._migrate()
 
-    def add_fallback_message(self, contractor_id: int, group_id: int, message_id: int) -> None:
+    def _migrate(self) -> None:
+        # create_all не меняет уже существующие таблицы
+        with self.engine.begin() as conn:
+            columns = {c["name"] for c in inspect(conn).get_columns("fallback_messages")}
+            if "account" not in columns:
+                conn.execute(text("ALTER TABLE fallback_messages ADD COLUMN account VARCHAR(64)"))
+        for idx in FallbackMessage.__table__.indexes:
+            idx.create(self.engine, checkfirst=True)
+
+    def add_fallback_message(
+        self, contractor_id: int, group_id: int, message_id: int, account: Optional[str] = None
+    ) -> None:
+        with Session(self.engine) as s:
+            s.add(
+                FallbackMessage(contractor_id=contractor_id, group_id=group_id, message_id=message_id, account=account)
+            )
+            s.commit()
+
+    def add_fallback_messages(self, rows: List[Tuple[int, int, int]], account: Optional[str] = None) -> None:
+        """(contractor_id, group_id, message_id) — одной транзакцией."""
+        if not rows:
+            return
         with Session(self.engine) as s:
-            s.add(FallbackMessage(contractor_id=contractor_id, group_id=group_id, message_id=message_id))
+            s.add_all(FallbackMessage(contractor_id=c, group_id=g, message_id=m, account=account) for c, g, m in rows)
             s.commit()
 
-    def get_fallback_message(self, contractor_id: int, group_id: int) -> Optional[FallbackMessage]:
+    def get_fallback_messages(self, contractor_id: int, group_id: int) -> List[FallbackMessage]:
         with Session(self.engine) as s:
             stmt = select(FallbackMessage).where(
                 FallbackMessage.contractor_id == contractor_id,
                 FallbackMessage.group_id == group_id,
             )
+            return list(s.execute(stmt).scalars().all())
+
+    def get_expired_fallback_messages(self, before: datetime, limit: int) -> List[FallbackMessage]:
+        with Session(self.engine) as s:
+            stmt = (
+                select(FallbackMessage)
+                .where(FallbackMessage.created_at < before)
+                .order_by(FallbackMessage.id)
+                .limit(limit)
+            )
+            return list(s.execute(stmt).scalars().all())
+
+    def count_fallback_pairs(self) -> List[Tuple[int, int, int]]:
+        """(contractor_id, group_id, количество) по всем ожидающим fallback-сообщениям."""
+        with Session(self.engine) as s:
+            stmt = select(FallbackMessage.contractor_id, FallbackMessage.group_id, func.count()).group_by(
+                FallbackMessage.contractor_id, FallbackMessage.group_id
+            )
+            return [tuple(r) for r in s.execute(stmt).all()]
+
+    def delete_fallback_messages(self, row_ids: List[int]) -> None:
+        if not row_ids:
+            return
+        with Session(self.engine) as s:
+            s.execute(delete(FallbackMessage).where(FallbackMessage.id.in_(row_ids)))
+            s.commit()
+
+    def enqueue_job(self, kind: str, payload: Dict[str, Any], key: Optional[str] = None) -> Job:
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            key=key,
+            status="queued",
+            payload=json.dumps(payload, ensure_ascii=False),
+        )
+        with Session(self.engine, expire_on_commit=False) as s:
+            s.add(job)
+            s.commit()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with Session(self.engine) as s:
+            return s.get(Job, job_id)
+
+    def find_active_job(self, kind: str, key: str) -> Optional[Job]:
+        with Session(self.engine) as s:
+            stmt = (
+                select(Job)
+                .where(Job.kind == kind, Job.key == key, Job.status.in_(("queued", "running")))
+                .order_by(Job.created_at)
+                .limit(1)
+            )
             return s.execute(stmt).scalars().first()
 
-    def delete_fallback_message(self, row_id: int) -> None:
+    def claim_next_job(self) -> Optional[Job]:
+        with Session(self.engine, expire_on_commit=False) as s:
+            job = s.execute(
+                select(Job).where(Job.status == "queued").order_by(Job.created_at).limit(1)
+            ).scalars().first()
+            if not job:
+                return None
+            # условный UPDATE — на случай, если задачу успел забрать другой воркер
+            res = s.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == "queued")
+                .values(status="running", attempts=Job.attempts + 1, updated_at=datetime.utcnow())
+            )
+            s.commit()
+            if res.rowcount != 1:
+                return None
+            s.refresh(job)
+            return job
+
+    def finish_job(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._set_job(job_id, status="done", result=json.dumps(result, ensure_ascii=False), error=None)
+
+    def fail_job(self, job_id: str, error: str, result: Optional[Dict[str, Any]] = None) -> None:
+        self._set_job(
+            job_id,
+            status="failed",
+            result=json.dumps(result, ensure_ascii=False) if result is not None else None,
+            error=error,
+        )
+
+    def set_job_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Промежуточный результат (прогресс) выполняющейся задачи."""
+        self._set_job(job_id, result=json.dumps(result, ensure_ascii=False))
+
+    def set_job_result_with_fallback(
+        self, job_id: str, result: Dict[str, Any], row: Optional[Tuple[int, int, int]], account: Optional[str] = None
+    ) -> None:
+        """Прогресс задачи и запись (contractor_id, group_id, message_id) отправленного ЛС — одной транзакцией."""
+        with Session(self.engine) as s:
+            if row is not None:
+                c, g, m = row
+                s.add(FallbackMessage(contractor_id=c, group_id=g, message_id=m, account=account))
+            s.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(updated_at=datetime.utcnow(), result=json.dumps(result, ensure_ascii=False))
+            )
+            s.commit()
+
+    def requeue_job(self, job_id: str) -> None:
+        with Session(self.engine) as s:
+            s.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "running")
+                .values(status="queued", updated_at=datetime.utcnow())
+            )
+            s.commit()
+
+    def requeue_running_jobs(self) -> int:
+        """Задачи, прерванные рестартом, возвращаем в очередь."""
+        with Session(self.engine) as s:
+            res = s.execute(
+                update(Job).where(Job.status == "running").values(status="queued", updated_at=datetime.utcnow())
+            )
+            s.commit()
+            return res.rowcount
+
+    def _set_job(self, job_id: str, **values) -> None:
+        with Session(self.engine) as s:
+            s.execute(update(Job).where(Job.id == job_id).values(updated_at=datetime.utcnow(), **values))
+            s.commit()
+
+    def get_order_group(self, order_id: str) -> Optional[OrderGroup]:
+        with Session(self.engine) as s:
+            return s.get(OrderGroup, order_id)
+
+    def save_order_group(
+        self,
+        order_id: str,
+        group_id: int,
+        group_link: Optional[str],
+        status: str,
+        from_spare: Optional[bool] = None,
+    ) -> None:
+        with Session(self.engine) as s:
+            row = s.get(OrderGroup, order_id)
+            if row is None:
+                row = OrderGroup(order_id=order_id, group_id=group_id, from_spare=bool(from_spare))
+                s.add(row)
+            row.group_id = group_id
+            row.group_link = group_link
+            row.status = status
+            if from_spare is not None:
+                row.from_spare = from_spare
+            row.updated_at = datetime.utcnow()
+            s.commit()
+
+    def add_spare_group(self, chat_id: int, bot2_username: Optional[str], bot3_username: Optional[str]) -> None:
+        with Session(self.engine) as s:
+            s.add(
+                SpareGroup(
+                    chat_id=chat_id,
+                    bot2_username=_norm_username(bot2_username),
+                    bot3_username=_norm_username(bot3_username),
+                )
+            )
+            s.commit()
+
+    def count_spare_groups(self, bot2_username: Optional[str], bot3_username: Optional[str]) -> int:
+        with Session(self.engine) as s:
+            stmt = select(func.count()).select_from(SpareGroup).where(
+                SpareGroup.status == "ready",
+                SpareGroup.bot2_username == _norm_username(bot2_username),
+                SpareGroup.bot3_username == _norm_username(bot3_username),
+            )
+            return s.execute(stmt).scalar_one()
+
+    def claim_spare_group(self, bot2_username: Optional[str], bot3_username: Optional[str]) -> Optional[int]:
+        """Забирает самую старую готовую группу с теми же ботами; None, если пул пуст."""
+        with Session(self.engine) as s:
+            chat_id = s.execute(
+                select(SpareGroup.chat_id)
+                .where(
+                    SpareGroup.status == "ready",
+                    SpareGroup.bot2_username == _norm_username(bot2_username),
+                    SpareGroup.bot3_username == _norm_username(bot3_username),
+                )
+                .order_by(SpareGroup.created_at)
+                .limit(1)
+            ).scalar()
+            if chat_id is None:
+                return None
+            res = s.execute(
+                update(SpareGroup)
+                .where(SpareGroup.chat_id == chat_id, SpareGroup.status == "ready")
+                .values(status="claimed")
+            )
+            s.commit()
+            return chat_id if res.rowcount == 1 else None
+
+    def set_chat_account(self, chat_id: int, account: str) -> None:
+        stmt = sqlite_insert(ChatAccount).values(chat_id=chat_id, account=account)
+        stmt = stmt.on_conflict_do_update(index_elements=[ChatAccount.chat_id], set_={"account": account})
+        with Session(self.engine) as s:
+            s.execute(stmt)
+            s.commit()
+
+    def get_chat_accounts(self) -> List[Tuple[int, str]]:
+        with Session(self.engine) as s:
+            return [(r.chat_id, r.account) for r in s.execute(select(ChatAccount.chat_id, ChatAccount.account))]
+
+    def get_peer(self, account: str, peer_id: int) -> Optional[PeerEntry]:
+        with Session(self.engine) as s:
+            return s.get(PeerEntry, (account, peer_id))
+
+    def get_peer_by_username(self, account: str, username: str) -> Optional[PeerEntry]:
+        with Session(self.engine) as s:
+            stmt = (
+                select(PeerEntry)
+                .where(PeerEntry.account == account, PeerEntry.username == username)
+                .order_by(PeerEntry.updated_at.desc())
+                .limit(1)
+            )
+            return s.execute(stmt).scalars().first()
+
+    def get_recent_peers(self, account: str, limit: int) -> List[PeerEntry]:
+        with Session(self.engine) as s:
+            stmt = (
+                select(PeerEntry)
+                .where(PeerEntry.account == account)
+                .order_by(PeerEntry.updated_at.desc())
+                .limit(limit)
+            )
+            return list(s.execute(stmt).scalars())
+
+    def upsert_peers(self, account: str, peers: List[Tuple[int, int, str, Optional[str]]]) -> None:
+        if not peers:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"account": account, "peer_id": pid, "access_hash": ah, "peer_type": pt, "username": un, "updated_at": now}
+            for pid, ah, pt, un in peers
+        ]
+        stmt = sqlite_insert(PeerEntry)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PeerEntry.account, PeerEntry.peer_id],
+            set_={
+                "access_hash": stmt.excluded.access_hash,
+                "peer_type": stmt.excluded.peer_type,
+                "username": stmt.excluded.username,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
         with Session(self.engine) as s:
-            s.execute(delete(FallbackMessage).where(FallbackMessage.id == row_id))
+            s.execute(stmt, rows)
             s.commit()
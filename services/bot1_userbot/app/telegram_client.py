@@ -1,22 +1,33 @@
 from __future__ import annotations
 
-import base64
-import io
+import asyncio
+import contextvars
 import logging
-import tempfile
-from dataclasses import dataclass
-from typing import Optional, List
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, List, Set, Tuple
 
 from pyrogram import Client
-from pyrogram.errors import RPCError
+from pyrogram.errors import UserAlreadyParticipant
 from pyrogram.raw import functions
 from pyrogram.types import Chat
 
+from .accounts import MAIN_ACCOUNT, Account
 from .config import settings
-from .storage import Storage
+from .icons import IconCache
+from .peer_cache import PeerCache
+from .scheduler import Priority, TelegramScheduler
+from .service_messages import ServiceMessages
+from .spans import observe_step, span
+from .steps import Step, StepResult, run_steps
+from .storage import FallbackMessage, Storage
 
 log = logging.getLogger("bot1.telegram")
 
+SPARE_GROUP_TITLE = "Новый заказ"
+
 
 @dataclass
 class GroupResult:
@@ -24,75 +35,233 @@ class GroupResult:
     group_id: Optional[int] = None
     group_link: Optional[str] = None
     error: Optional[str] = None
+    steps: List[StepResult] = field(default_factory=list)
+
+
+# аккаунт пула, через который идут вызовы в текущей операции (см. TelegramUserbot.use)
+_account: contextvars.ContextVar[Optional[Account]] = contextvars.ContextVar("bot1_account", default=None)
 
 
 class TelegramUserbot:
+    """Пул userbot-аккаунтов: основной (PYROGRAM_SESSION_STRING) и дополнительные (PYROGRAM_EXTRA_SESSIONS).
+
+    Новые группы создаёт наименее загруженный доступный аккаунт; всё остальное по группе
+    (настройка, кики, ЛС подрядчикам) делает аккаунт-владелец — у него есть права и access_hash участников.
+    client/scheduler/peers — аккаунта текущей операции.
+    """
+
     def __init__(self, storage: Storage):
         self.storage = storage
-        self.client = Client(
-            name="bot1_userbot",
-            api_id=settings.tg_api_id,
-            api_hash=settings.tg_api_hash,
-            session_string=settings.pyrogram_session_string,
-            workdir="/data",
-            in_memory=False,
+        self.main = Account(MAIN_ACCOUNT, settings.pyrogram_session_string, storage)
+        self.accounts: Dict[str, Account] = {MAIN_ACCOUNT: self.main}
+        for name, session_string in settings.pyrogram_extra_sessions.items():
+            self.accounts[name] = Account(name, session_string, storage)
+
+        self.icons = IconCache(
+            max_bytes=int(settings.icon_cache_mb * 1024 * 1024),
+            max_side=settings.icon_max_side,
+            jpeg_quality=settings.icon_jpeg_quality,
         )
+        self.service_messages = ServiceMessages()
+
+        # (contractor_id, group_id) -> сколько fallback-сообщений ждут удаления.
+        # Обновления участников приходят по всем чатам аккаунта; лишние отсекаем без похода в БД.
+        self._fallback_pending: Counter = Counter()
+        # пары, вступление по которым уже обрабатывается: обновление приходит каждому аккаунту пула в группе
+        self._joins_inflight: Set[Tuple[int, int]] = set()
+        # chat_id -> аккаунт-владелец (копия chat_accounts в памяти, см. load_chat_owners)
+        self._owners: Dict[int, str] = {}
 
         # event handlers
-        @self.client.on_chat_member_updated()
         async def _on_member_update(_, update):
             # If a contractor joined the group, delete previously sent fallback message in private chat
             try:
                 group_id = update.chat.id
                 user_id = update.new_chat_member.user.id if update.new_chat_member else None
-                if not user_id:
-                    return
-                row = self.storage.get_fallback_message(contractor_id=user_id, group_id=group_id)
-                if not row:
+                pair = (user_id, group_id)
+                if not user_id or pair not in self._fallback_pending or pair in self._joins_inflight:
                     return
-                # delete outgoing message in user's private chat
+                self._joins_inflight.add(pair)
                 try:
-                    await self.client.delete_messages(chat_id=user_id, message_ids=[row.message_id])
+                    # SQLite — синхронный, выносим из event loop
+                    rows = await asyncio.to_thread(
+                        self.storage.get_fallback_messages, contractor_id=user_id, group_id=group_id
+                    )
+                    if not rows:
+                        self._fallback_pending.pop(pair, None)
+                        return
+                    with self.scheduler.lane(Priority.FALLBACK_DM):
+                        await self.purge_fallback_messages(rows)
                 finally:
-                    self.storage.delete_fallback_message(row.id)
-                    log.info("Deleted fallback message %s for user %s in group %s", row.message_id, user_id, group_id)
+                    self._joins_inflight.discard(pair)
+                log.info("Deleted %s fallback message(s) for user %s in group %s", len(rows), user_id, group_id)
             except Exception:
                 log.exception("Failed handling chat_member_updated")
 
+        for acc in self.accounts.values():
+            self.service_messages.attach(acc.client)
+            acc.client.on_chat_member_updated()(_on_member_update)
+
+    @property
+    def account(self) -> Account:
+        return _account.get() or self.main
+
+    @property
+    def client(self) -> Client:
+        return self.account.client
+
+    @property
+    def scheduler(self) -> TelegramScheduler:
+        return self.account.scheduler
+
+    @property
+    def peers(self) -> PeerCache:
+        return self.account.peers
+
+    @contextmanager
+    def use(self, account: Account):
+        token = _account.set(account)
+        try:
+            yield account
+        finally:
+            _account.reset(token)
+
+    def pick(self, method: Optional[str] = None) -> Account:
+        """Наименее загруженный доступный аккаунт (method — не заблокированный FloodWait'ом по нему)."""
+        candidates = [a for a in self.accounts.values() if a.available] or [
+            # все в backoff'е — тот, кто вернётся раньше
+            min((a for a in self.accounts.values() if a.started), key=lambda a: a.backoff_until, default=self.main)
+        ]
+        return min(
+            candidates,
+            key=lambda a: (a.scheduler.blocked_for(method) if method else 0.0, a.scheduler.pending),
+        )
+
+    def owner(self, chat_id: int) -> Account:
+        """Аккаунт, создавший группу; группы без записи (созданы до пула) — основного."""
+        if len(self.accounts) == 1:
+            return self.main
+        return self.accounts.get(self._owners.get(chat_id)) or self.main
+
+    async def load_chat_owners(self) -> int:
+        self._owners = dict(await asyncio.to_thread(self.storage.get_chat_accounts))
+        return len(self._owners)
+
+    async def _set_owner(self, chat_id: int, account: Account) -> None:
+        self._owners[chat_id] = account.name
+        await asyncio.to_thread(self.storage.set_chat_account, chat_id, account.name)
+
+    def export_metrics(self) -> None:
+        for acc in self.accounts.values():
+            acc.export_metrics()
+
+    def _fallback_done(self, pair: Tuple[int, int], n: int = 1) -> None:
+        self._fallback_pending[pair] -= n
+        if self._fallback_pending[pair] <= 0:
+            del self._fallback_pending[pair]
+
+    async def purge_fallback_messages(self, rows: List[FallbackMessage]) -> None:
+        """Удаляет fallback-сообщения у исполнителей (по одному delete_messages на чат) и их записи в БД."""
+        by_chat: Dict[Tuple[str, int], List[FallbackMessage]] = defaultdict(list)
+        for row in rows:
+            by_chat[(row.account or MAIN_ACCOUNT, row.contractor_id)].append(row)
+        for (account, chat_id), chat_rows in by_chat.items():
+            ids = [r.message_id for r in chat_rows]
+            try:
+                # удалить может только отправивший аккаунт
+                with self.use(self.accounts.get(account, self.main)):
+                    # лимит Telegram — 100 сообщений за вызов
+                    for i in range(0, len(ids), 100):
+                        await self.scheduler.call("delete_messages", chat_id=chat_id, message_ids=ids[i : i + 100])
+            except Exception:
+                # сообщение могли уже удалить или чат недоступен — запись всё равно убираем
+                log.warning("Failed to delete fallback messages %s in chat %s", ids, chat_id, exc_info=True)
+            finally:
+                await asyncio.to_thread(self.storage.delete_fallback_messages, [r.id for r in chat_rows])
+                for r in chat_rows:
+                    self._fallback_done((r.contractor_id, r.group_id))
+
+    async def load_fallback_index(self) -> int:
+        pairs = await asyncio.to_thread(self.storage.count_fallback_pairs)
+        self._fallback_pending = Counter({(c, g): n for c, g, n in pairs})
+        return len(self._fallback_pending)
+
     async def start(self) -> None:
-        await self.client.start()
-        me = await self.client.get_me()
-        log.info("Bot1 userbot started as %s", me.id)
+        await self.main.start()
+        for acc in self.accounts.values():
+            if acc is self.main:
+                continue
+            try:
+                await acc.start()
+            except Exception:
+                # без дополнительного аккаунта сервис работает, просто медленнее
+                log.exception("Failed to start account %s, leaving it out of rotation", acc.name)
 
     async def stop(self) -> None:
-        await self.client.stop()
+        for acc in self.accounts.values():
+            await acc.stop()
+
+    async def prefetch_peers(self, cached: int, dialogs: int) -> int:
+        """Прогрев: последние peer'ы из БД в LRU и диалоги из Telegram (их peer'ы попадут в кэш сами)."""
+        total = 0
+        for acc in self.accounts.values():
+            if not acc.started:
+                continue
+            total += await acc.peers.preload(cached)
+            if dialogs <= 0:
+                continue
+            try:
+                with acc.scheduler.lane(Priority.BACKGROUND):
+                    total += len(await acc.scheduler.collect("get_dialogs", limit=dialogs))
+            except Exception:
+                # холодный кэш — не повод не стартовать
+                log.warning("Dialog prefetch failed for account %s", acc.name, exc_info=True)
+        return total
+
+    async def _ensure_peers(self, *refs) -> None:
+        await self.peers.ensure(refs, resolve=lambda ref: self.scheduler.call("resolve_peer", ref))
 
     async def _set_chat_photo(self, chat_id: int, icon_base64: str) -> None:
-        raw = base64.b64decode(icon_base64)
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=True) as f:
-            f.write(raw)
-            f.flush()
-            await self.client.set_chat_photo(chat_id, photo=f.name)
+        icon = await asyncio.to_thread(self.icons.get, icon_base64)
+        account = self.account.name
+        file_id = icon.file_ids.get(account)
+        if file_id:
+            try:
+                # уже загруженное фото — без повторной загрузки файла
+                await self.scheduler.call("set_chat_photo", chat_id, photo=file_id)
+                return
+            except Exception as e:
+                # file_reference мог устареть — загружаем заново
+                log.info("Cached icon file_id rejected (%s), re-uploading", e)
+                icon.file_ids.pop(account, None)
+        await self.scheduler.call("set_chat_photo", chat_id, photo=icon.open())
+        try:
+            photos = await self.scheduler.collect("get_chat_photos", chat_id, limit=1)
+            if photos:
+                icon.file_ids[account] = photos[0].file_id
+        except Exception:
+            log.warning("Failed to fetch uploaded photo of chat %s", chat_id, exc_info=True)
 
     async def _open_history_for_users(self, chat_id: int) -> None:
-        # Best effort: Telegram setting "Chat history for new members"
+        # Best effort (ошибка попадёт в результат шага): Telegram setting "Chat history for new members"
         # Using raw ToggleChatPreHistoryHidden(enabled=False) (name can differ by layer)
-        try:
-            peer = await self.client.resolve_peer(chat_id)
-            await self.client.invoke(functions.messages.ToggleChatPreHistoryHidden(peer=peer, enabled=False))
-            log.info("Opened history for users in chat %s", chat_id)
-        except Exception as e:
-            log.warning("Could not toggle pre-history visibility in chat %s: %s", chat_id, e)
+        peer = await self.scheduler.call("resolve_peer", chat_id)
+        await self.scheduler.call("invoke", functions.messages.ToggleChatPreHistoryHidden(peer=peer, enabled=False))
+        log.info("Opened history for users in chat %s", chat_id)
 
     async def _delete_recent_messages(self, chat_id: int, limit: int = 50) -> None:
-        ids = []
-        async for m in self.client.get_chat_history(chat_id, limit=limit):
-            ids.append(m.id)
+        ids = [m.id for m in await self.scheduler.collect("get_chat_history", chat_id, limit=limit)]
         if ids:
-            try:
-                await self.client.delete_messages(chat_id, message_ids=ids, revoke=True)
-            except Exception as e:
-                log.warning("Failed deleting recent messages in chat %s: %s", chat_id, e)
+            await self.scheduler.call("delete_messages", chat_id, message_ids=ids, revoke=True)
+
+    async def _delete_service_messages(self, chat_id: int, found: Optional[Dict[int, Set[int]]]) -> None:
+        """Удаляет сервисные сообщения, собранные ServiceMessages.collect(); без них — просмотр истории."""
+        ids = sorted(found.get(chat_id, ())) if found is not None else []
+        if not ids:
+            await self._delete_recent_messages(chat_id)
+            return
+        for i in range(0, len(ids), 100):
+            await self.scheduler.call("delete_messages", chat_id, message_ids=ids[i : i + 100], revoke=True)
 
     async def create_and_setup_group(
         self,
@@ -104,52 +273,127 @@ class TelegramUserbot:
         contractor_ids: List[int],
         bot2_username: str,
         bot3_username: str,
+        chat_id: Optional[int] = None,
+        from_spare: bool = False,
+        on_created: Optional[Callable[[int, bool], None]] = None,
     ) -> GroupResult:
+        """Создаёт и настраивает группу.
+
+        chat_id — продолжить настройку уже созданного чата (повтор после сбоя), from_spare — он был взят из пула;
+        on_created(chat_id, from_spare) вызывается сразу после создания чата, до настройки.
+        """
+        started = time.perf_counter()
+        res: Optional[GroupResult] = None
         try:
-            # Create group with curator as initial member (Telegram requires at least one invite)
-            chat: Chat = await self.client.create_group(title=title, users=[curator_id])
-            chat_id = chat.id
+            rename = resumed = chat_id is not None
+            from_spare = from_spare and resumed
+            claimed = False
+            if chat_id is None and settings.spare_pool_size > 0:
+                with span("create_group", "claim_spare"):
+                    chat_id = self.storage.claim_spare_group(bot2_username, bot3_username)
+                claimed = from_spare = rename = chat_id is not None
+            # существующую группу настраивает её владелец, новую создаёт наименее загруженный аккаунт
+            account = self.owner(chat_id) if chat_id is not None else self.pick("create_group")
+            if claimed:
+                log.info("Using spare group %s (account %s)", chat_id, account.name)
+                # до первого await: взятая из пула группа сразу привязана к заказу и не теряется при отмене
+                if on_created:
+                    on_created(chat_id, True)
 
-            if description:
-                try:
-                    await self.client.set_chat_description(chat_id, description)
-                except Exception as e:
-                    log.warning("Failed setting description: %s", e)
+            # Все вызовы Telegram внутри (включая задачи шагов) идут в полосе create_group
+            # и собирают id своих сервисных сообщений для точечной очистки
+            with (
+                self.use(account),
+                self.scheduler.lane(Priority.CREATE_GROUP),
+                self.service_messages.collect() as found,
+            ):
+                with span("create_group", "ensure_peers"):
+                    await self._ensure_peers(bot2_username, bot3_username, curator_id, *contractor_ids)
 
-            if icon_base64:
-                try:
-                    await self._set_chat_photo(chat_id, icon_base64)
-                except Exception as e:
-                    log.warning("Failed setting photo: %s", e)
+                if chat_id is None:
+                    try:
+                        # Create group with curator as initial member (Telegram requires at least one invite)
+                        with span("create_group", "create_chat"):
+                            chat: Chat = await self.scheduler.call("create_group", title=title, users=[curator_id])
+                    except Exception as e:
+                        log.exception("create_and_setup_group failed")
+                        res = GroupResult(ok=False, error=str(e))
+                        return res
+                    chat_id = chat.id
+                    await self._set_owner(chat_id, account)
+                    if on_created:
+                        on_created(chat_id, False)
 
-            # Add bots and promote them
-            # Telegram expects usernames without @
-            for uname in [bot2_username, bot3_username]:
-                try:
-                    await self.client.add_chat_members(chat_id, [uname])
-                except RPCError as e:
-                    log.warning("Failed adding %s: %s", uname, e)
+                steps = self._group_setup_steps(
+                    chat_id=chat_id,
+                    description=description,
+                    icon_base64=icon_base64,
+                    curator_id=curator_id,
+                    curator_label=curator_label,
+                    contractor_ids=contractor_ids,
+                    bot2_username=bot2_username,
+                    bot3_username=bot3_username,
+                    title=title if rename else None,
+                    from_spare=from_spare,
+                    # продолжение прошлой попытки: часть сообщений появилась до этого запуска
+                    service_messages=None if resumed else found,
+                )
+                results = await run_steps(steps, concurrency=settings.group_setup_concurrency, op="create_group")
 
-                try:
-                    await self.client.promote_chat_member(
-                        chat_id,
-                        uname,
-                        can_manage_chat=True,
-                        can_delete_messages=True,
-                        can_manage_video_chats=True,
-                        can_restrict_members=True,
-                        can_promote_members=False,
-                        can_change_info=True,
-                        can_invite_users=True,
-                        can_pin_messages=True,
-                        is_anonymous=True,
-                    )
-                except Exception as e:
-                    log.warning("Failed promoting %s as anonymous admin: %s", uname, e)
+                link = results.get("export_invite_link")
+                group_link = link.result if link and link.ok else None
+                res = GroupResult(ok=True, group_id=chat_id, group_link=group_link, steps=list(results.values()))
+                return res
+        finally:
+            observe_step("create_group", "total", time.perf_counter() - started, bool(res and res.ok))
 
-            # Promote curator + set label (custom title)
-            try:
-                await self.client.promote_chat_member(
+    def _group_setup_steps(
+        self,
+        chat_id: int,
+        description: Optional[str],
+        icon_base64: Optional[str],
+        curator_id: int,
+        curator_label: str,
+        contractor_ids: List[int],
+        bot2_username: Optional[str],
+        bot3_username: Optional[str],
+        title: Optional[str] = None,
+        from_spare: bool = False,
+        service_messages: Optional[Dict[int, Set[int]]] = None,
+    ) -> List[Step]:
+        """Граф шагов настройки уже созданной группы.
+
+        Всё, что порождает сервисные сообщения, выполняется до очистки истории;
+        открытие истории и экспорт ссылки — в конце, как и раньше.
+        title — переименовать чат (группа взята из пула или создана прошлой попыткой).
+        from_spare — группа из пула: боты и история уже настроены, куратора нужно добавить.
+        service_messages — id сервисных сообщений, пойманных при настройке; None — чистить по истории.
+        """
+        call = self.scheduler.call
+        steps: List[Step] = []
+
+        if title:
+            steps.append(Step("set_title", lambda: call("set_chat_title", chat_id, title)))
+
+        if description:
+            steps.append(Step("set_description", lambda: call("set_chat_description", chat_id, description)))
+
+        if icon_base64:
+            steps.append(Step("set_photo", lambda: self._set_chat_photo(chat_id, icon_base64)))
+
+        if not from_spare:
+            steps.extend(self._bot_steps(chat_id, bot2_username, bot3_username))
+
+        # Promote curator + set label (custom title)
+        curator_deps: tuple = ()
+        if from_spare:
+            steps.append(Step("add_curator", lambda: self._add_members(chat_id, [curator_id])))
+            curator_deps = ("add_curator",)
+        steps.append(
+            Step(
+                "promote_curator",
+                lambda: call(
+                    "promote_chat_member",
                     chat_id,
                     curator_id,
                     can_manage_chat=True,
@@ -160,46 +404,213 @@ class TelegramUserbot:
                     can_change_info=True,
                     can_invite_users=True,
                     can_pin_messages=True,
-                )
-                await self.client.set_administrator_title(chat_id, curator_id, curator_label)
-            except Exception as e:
-                log.warning("Failed promoting curator: %s", e)
+                ),
+                deps=curator_deps,
+            )
+        )
+        steps.append(
+            Step(
+                "set_curator_title",
+                lambda: call("set_administrator_title", chat_id, curator_id, curator_label),
+                deps=("promote_curator",),
+                requires_ok=True,
+            )
+        )
 
-            # Add contractors
-            if contractor_ids:
-                try:
-                    await self.client.add_chat_members(chat_id, contractor_ids)
-                except Exception as e:
-                    log.warning("Failed adding contractors: %s", e)
+        if contractor_ids:
+            steps.append(Step("add_contractors", lambda: self._add_members(chat_id, contractor_ids)))
 
-            # Delete service messages / clear chat
-            await self._delete_recent_messages(chat_id)
+        # Delete service messages / clear chat — after everything that produces them
+        steps.append(
+            Step(
+                "clear_history",
+                lambda: self._delete_service_messages(chat_id, service_messages),
+                deps=tuple(s.name for s in steps),
+            )
+        )
+        last = "clear_history"
+        if not from_spare:
+            steps.append(Step("open_history", lambda: self._open_history_for_users(chat_id), deps=(last,)))
+            last = "open_history"
+        steps.append(Step("export_invite_link", lambda: call("export_chat_invite_link", chat_id), deps=(last,)))
+        return steps
+
+    async def _add_members(self, chat_id: int, users: List) -> None:
+        """add_chat_members, для которого «уже в чате» — успех (повтор настройки, бот из create_group)."""
+        try:
+            await self.scheduler.call("add_chat_members", chat_id, users)
+        except UserAlreadyParticipant:
+            if len(users) == 1:
+                return
+            # в обычной группе добавление идёт по одному и обрывается на первом участнике — добавляем остальных
+            for u in users:
+                try:
+                    await self.scheduler.call("add_chat_members", chat_id, [u])
+                except UserAlreadyParticipant:
+                    pass
 
-            # Open history
-            await self._open_history_for_users(chat_id)
+    def _bot_steps(
+        self,
+        chat_id: int,
+        bot2_username: Optional[str],
+        bot3_username: Optional[str],
+        invited: Optional[str] = None,
+    ) -> List[Step]:
+        """Добавление и повышение ботов; invited — бот уже в чате (приглашён при create_group), только повышаем."""
+        # Telegram expects usernames without @
+        call = self.scheduler.call
+        steps: List[Step] = []
+        for key, uname in (("bot2", bot2_username), ("bot3", bot3_username)):
+            if not uname:
+                continue
+            deps: tuple = ()
+            if uname != invited:
+                steps.append(Step(f"add_{key}", lambda u=uname: self._add_members(chat_id, [u])))
+                deps = (f"add_{key}",)
+            steps.append(
+                Step(
+                    f"promote_{key}",
+                    lambda u=uname: call(
+                        "promote_chat_member",
+                        chat_id,
+                        u,
+                        can_manage_chat=True,
+                        can_delete_messages=True,
+                        can_manage_video_chats=True,
+                        can_restrict_members=True,
+                        can_promote_members=False,
+                        can_change_info=True,
+                        can_invite_users=True,
+                        can_pin_messages=True,
+                        is_anonymous=True,
+                    ),
+                    deps=deps,
+                )
+            )
+        return steps
 
-            # Export invite link
-            group_link = None
+    async def create_spare_group(self, bot2_username: Optional[str], bot3_username: Optional[str]) -> int:
+        """Создаёт заготовку группы для пула: боты-админы добавлены, история открыта, чат очищен."""
+        account = self.pick("create_group")
+        with self.use(account), self.scheduler.lane(Priority.BACKGROUND), self.service_messages.collect() as found:
+            await self._ensure_peers(bot2_username, bot3_username)
+            first = bot2_username or bot3_username
+            chat: Chat = await self.scheduler.call("create_group", title=SPARE_GROUP_TITLE, users=[first])
+            chat_id = chat.id
+            await self._set_owner(chat_id, account)
             try:
-                group_link = await self.client.export_chat_invite_link(chat_id)
-            except Exception as e:
-                log.warning("Failed exporting invite link: %s", e)
+                steps = self._bot_steps(chat_id, bot2_username, bot3_username, invited=first)
+                steps.append(
+                    Step(
+                        "clear_history",
+                        lambda: self._delete_service_messages(chat_id, found),
+                        deps=tuple(s.name for s in steps),
+                    )
+                )
+                steps.append(
+                    Step("open_history", lambda: self._open_history_for_users(chat_id), deps=("clear_history",))
+                )
+                results = await run_steps(steps, concurrency=settings.group_setup_concurrency)
+                failed = [r.name for r in results.values() if not r.ok and r.name != "open_history"]
+                if failed:
+                    raise RuntimeError(f"Spare group {chat_id} setup failed: {', '.join(failed)}")
+            except Exception:
+                # неполная заготовка хуже, чем её отсутствие — в пул не кладём и удаляем, чтобы не копились сироты
+                await self._delete_spare_group(chat_id)
+                raise
+            return chat_id
 
-            return GroupResult(ok=True, group_id=chat_id, group_link=group_link)
+    async def _delete_spare_group(self, chat_id: int) -> None:
+        try:
+            # заготовка — обычная группа: её id в Pyrogram — это -chat_id
+            await self.scheduler.call("invoke", functions.messages.DeleteChat(chat_id=-chat_id))
+            log.info("Deleted incomplete spare group %s", chat_id)
         except Exception as e:
-            log.exception("create_and_setup_group failed")
-            return GroupResult(ok=False, error=str(e))
+            log.error("Failed to delete incomplete spare group %s, left orphaned: %s", chat_id, e)
 
     async def remove_contractor(self, chat_id: int, contractor_id: int) -> None:
         # Kick via ban+unban
         try:
-            await self.client.ban_chat_member(chat_id, contractor_id)
-            await self.client.unban_chat_member(chat_id, contractor_id)
+            with span("remove_contractor", "total"):
+                with self.use(self.owner(chat_id)), self.scheduler.lane(Priority.KICK):
+                    with span("remove_contractor", "ensure_peers"):
+                        await self._ensure_peers(chat_id, contractor_id)
+                    with span("remove_contractor", "ban"):
+                        await self.scheduler.call("ban_chat_member", chat_id, contractor_id)
+                    with span("remove_contractor", "unban"):
+                        await self.scheduler.call("unban_chat_member", chat_id, contractor_id)
         except Exception as e:
             log.warning("Failed removing contractor %s from %s: %s", contractor_id, chat_id, e)
             raise
 
+    async def send_fallback_messages(
+        self,
+        items: List[Tuple[int, int, str]],
+        on_result: Optional[Callable[[int, Optional[int], Optional[str], str], Awaitable[None]]] = None,
+    ) -> List[Tuple[Optional[int], Optional[str]]]:
+        """Пачка fallback-сообщений (contractor_id, group_id, text): темп задаёт планировщик.
+        Возвращает (message_id, error) по каждому. Без on_result записи для отслеживания сохраняются
+        одной транзакцией на аккаунт; on_result(i, message_id, error, account) вызывается сразу после
+        отправки каждого и сам сохраняет запись для отслеживания (вместе со своим прогрессом)."""
+        # ЛС шлёт владелец группы — подрядчик ему известен; аккаунты работают параллельно
+        by_account: Dict[str, List[int]] = defaultdict(list)
+        for i, (_, group_id, _) in enumerate(items):
+            by_account[self.owner(group_id).name].append(i)
+        sent: List[Tuple[Optional[int], Optional[str]]] = [(None, None)] * len(items)
+
+        async def send(account: Account, idx: List[int]) -> None:
+            rows = []
+
+            async def one(i: int) -> None:
+                contractor_id, group_id, text = items[i]
+                try:
+                    msg = await self.scheduler.call("send_message", contractor_id, text)
+                except Exception as e:
+                    sent[i] = (None, str(e))
+                else:
+                    sent[i] = (msg.id, None)
+                if on_result:
+                    try:
+                        await on_result(i, *sent[i], account.name)
+                    except Exception:
+                        log.exception("Failed saving result of fallback message to %s", contractor_id)
+                    else:
+                        if sent[i][0] is not None:
+                            self._fallback_pending[(contractor_id, group_id)] += 1
+                        return
+                # без on_result (или если он не сохранил) — записываем сами после пачки
+                if sent[i][0] is not None:
+                    rows.append((contractor_id, group_id, sent[i][0]))
+
+            with self.use(account), self.scheduler.lane(Priority.FALLBACK_DM):
+                try:
+                    await self._ensure_peers(*{items[i][0] for i in idx})
+                except Exception:
+                    # неразрешённые peer'ы дадут ошибку отправки своих сообщений, остальные уйдут
+                    log.warning("Failed preparing peers for fallback messages", exc_info=True)
+                await asyncio.gather(*(one(i) for i in idx))
+            await asyncio.to_thread(self.storage.add_fallback_messages, rows, account.name)
+            for c, g, _ in rows:
+                self._fallback_pending[(c, g)] += 1
+
+        await asyncio.gather(*(send(self.accounts[name], idx) for name, idx in by_account.items()))
+        return sent
+
     async def send_fallback_message_and_track(self, contractor_id: int, group_id: int, text: str) -> int:
-        msg = await self.client.send_message(contractor_id, text)
-        self.storage.add_fallback_message(contractor_id=contractor_id, group_id=group_id, message_id=msg.id)
-        return msg.id
+        with span("fallback_dm", "total"):
+            account = self.owner(group_id)
+            with self.use(account), self.scheduler.lane(Priority.FALLBACK_DM):
+                with span("fallback_dm", "ensure_peers"):
+                    await self._ensure_peers(contractor_id)
+                with span("fallback_dm", "send_message"):
+                    msg = await self.scheduler.call("send_message", contractor_id, text)
+            with span("fallback_dm", "track"):
+                await asyncio.to_thread(
+                    self.storage.add_fallback_message,
+                    contractor_id=contractor_id,
+                    group_id=group_id,
+                    message_id=msg.id,
+                    account=account.name,
+                )
+            self._fallback_pending[(contractor_id, group_id)] += 1
+            return msg.id
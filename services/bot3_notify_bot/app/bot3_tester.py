@@ -6,9 +6,12 @@
 """
 
 import argparse
+import itertools
 import re
 import sys
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
 
 try:
     import httpx
@@ -113,6 +116,66 @@ def action_send_raw(client: httpx.Client, base: str) -> None:
     print(f"HTTP {r.status_code}\n{_extract_flash(r.text)}")
 
 
+# --- нагрузочный режим (--action load) ---
+
+# действие -> эндпоинт веб-формы
+LOAD_ENDPOINTS = {
+    "send_new_order": "/ui/send/new-order",
+    "send_payment": "/ui/send/payment",
+    "send_raw": "/ui/send/raw",
+    "pin_order_details": "/ui/chat/pin-order-details",
+}
+
+
+def _loadgen():
+    # общая часть нагрузочного режима — services/scripts/loadgen.py (тестер запускается из репозитория)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+    import loadgen
+
+    return loadgen
+
+
+def _generate_scenarios(args) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    # pin_order_details шлёт в группу, его в mixed нет — только явно
+    kinds = ["send_new_order", "send_payment", "send_raw"] if args.scenario == "mixed" else [args.scenario]
+    contractors = args.contractor_ids or [111111111]
+    for i, kind in zip(range(args.requests), itertools.cycle(kinds)):
+        contractor_id = contractors[i % len(contractors)]
+        if kind == "send_new_order":
+            yield kind, {"contractor_id": contractor_id, "order_title": f"LOAD-{i}", "group_link": args.group_link}
+        elif kind == "send_payment":
+            yield kind, {"contractor_id": contractor_id, "amount_rub": 1000 + i, "order_id": f"LOAD-{i}"}
+        elif kind == "send_raw":
+            yield kind, {"contractor_id": contractor_id, "text": f"Нагрузочный тест #{i}", "order_id": ""}
+        else:
+            yield kind, {"chat_id": args.chat_id, "order_id": f"LOAD-{i}", "title": f"LOAD-{i}"}
+
+
+async def _load_one(client: "httpx.AsyncClient", base: str, action: str, payload: Dict[str, Any]) -> Optional[str]:
+    """Один submit формы; возвращает ключ ошибки для сводки или None.
+
+    Веб-UI отвечает редиректом 303 на /?msg=... (успех) или /?err=... (ошибка).
+    """
+    try:
+        r = await client.post(f"{base}{LOAD_ENDPOINTS[action]}", data=payload)
+    except httpx.HTTPError as e:
+        return type(e).__name__
+    if r.status_code != 303:
+        return f"HTTP {r.status_code}"
+    err = parse_qs(urlsplit(r.headers.get("location", "")).query).get("err")
+    if err:
+        # "Forbidden: ..." -> "Forbidden"
+        return unquote(err[0]).split(":")[0][:80]
+    return None
+
+
+def action_load(args) -> None:
+    async def send_one(client: "httpx.AsyncClient", action: str, payload: Dict[str, Any]) -> Optional[str]:
+        return await _load_one(client, args.base_url.rstrip("/"), action, payload)
+
+    _loadgen().main_load(args, _generate_scenarios, LOAD_ENDPOINTS, send_one)
+
+
 def menu() -> str:
     print("\nВыбери действие:")
     print("  1) open_ui")
@@ -133,11 +196,30 @@ def main() -> None:
     ap.add_argument("--base-url", default="http://127.0.0.1:8002", help="Bot3 base url")
     ap.add_argument(
         "--action",
-        choices=["menu", "open_ui", "health", "send_new_order", "send_payment", "pin_order_details", "send_raw"],
+        choices=[
+            "menu", "open_ui", "health", "send_new_order", "send_payment", "pin_order_details", "send_raw", "load"
+        ],
         default="menu",
     )
+
+    load = ap.add_argument_group("load", "нагрузочный режим: --action load")
+    load.add_argument("--scenario", choices=list(LOAD_ENDPOINTS) + ["mixed"], default="send_new_order")
+    load.add_argument("--replay", help="JSONL со сценариями {action, payload} вместо генерации")
+    load.add_argument("--save-scenarios", help="записать сгенерированные сценарии в JSONL для повторного прогона")
+    load.add_argument("--requests", type=int, default=100, help="сколько запросов сгенерировать")
+    load.add_argument("--concurrency", type=int, default=10, help="максимум запросов в полёте")
+    load.add_argument("--rate", type=float, default=0.0, help="целевой темп, req/s (0 — без ограничения темпа)")
+    load.add_argument("--timeout", type=float, default=60.0)
+    load.add_argument("--contractor-ids", type=lambda s: [int(x) for x in s.split(",") if x], default=[])
+    load.add_argument("--group-link", default="https://t.me/+load")
+    load.add_argument("--chat-id", type=int, default=-1001234567890, help="группа для pin_order_details")
+    load.add_argument("--json-out", help="куда записать отчёт в JSON; '-' — только JSON в stdout")
     args = ap.parse_args()
 
+    if args.action == "load":
+        action_load(args)
+        return
+
     base = args.base_url.rstrip("/")
 
     if args.action == "open_ui":
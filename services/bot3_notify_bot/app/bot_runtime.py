@@ -1,10 +1,16 @@
+import asyncio
 import logging
-from typing import Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo, Update
+from telegram.error import BadRequest, NetworkError, RetryAfter
 from telegram.ext import Application, CommandHandler, ContextTypes
 
 from .config import settings
+from .fake_bot import FakeBot, FakeOptions
+from .limiter import SendLimiter
+from .outbox import Outbox
 
 log = logging.getLogger("bot3.runtime")
 
@@ -33,59 +39,181 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("Команды: /start — открыть кабинет.")
 
 
+class ShuttingDown(RuntimeError):
+    pass
+
+
 class Bot3:
+    # методы, которые можно повторить после рестарта (см. Outbox)
+    RESUMABLE = ("send_new_order", "send_payment", "pin_order_details", "send_raw")
+
     def __init__(self):
+        self.application: Optional[Application] = None
+        self.outbox = Outbox(settings.bot3_outbox_path)
+        self._accepting = True
+        self._inflight: Dict[asyncio.Task, str] = {}
+        self._resume_task: Optional[asyncio.Task] = None
+        self.limiter = SendLimiter(
+            global_rate=settings.tg_global_rate, chat_rate=settings.tg_chat_rate, group_rate=settings.tg_group_rate
+        )
+        if settings.bot3_backend == "fake":
+            # симулятор Bot API без сети — для нагрузочных и сквозных тестов; polling не запускается
+            self.bot = FakeBot(
+                FakeOptions(
+                    latency_ms=settings.fake_tg_latency_ms,
+                    jitter_ms=settings.fake_tg_jitter_ms,
+                    flood_rate=settings.fake_tg_flood_rate,
+                    flood_wait_sec=settings.fake_tg_flood_wait_sec,
+                    forbidden_rate=settings.fake_tg_forbidden_rate,
+                    seed=settings.fake_tg_seed,
+                )
+            )
+            return
         self.application = Application.builder().token(settings.bot3_token).build()
         self.application.add_handler(CommandHandler("start", start_cmd))
         self.application.add_handler(CommandHandler("help", help_cmd))
+        self.bot = self.application.bot
 
     async def start(self) -> None:
-        # Manual lifecycle control (recommended when integrating with other asyncio frameworks)
-        await self.application.initialize()
-        await self.application.updater.initialize()
-        await self.application.updater.start_polling(drop_pending_updates=True)
-        await self.application.start()
-        log.info("Bot3 polling started")
-
-    async def stop(self) -> None:
-        try:
-            await self.application.updater.stop()
-        except Exception:
-            pass
+        self._accepting = True
+        if self.application is None:
+            log.info("Bot3 started with fake Telegram backend")
+        else:
+            # Manual lifecycle control (recommended when integrating with other asyncio frameworks)
+            await self.application.initialize()
+            await self.application.updater.initialize()
+            await self.application.updater.start_polling(drop_pending_updates=True)
+            await self.application.start()
+            log.info("Bot3 polling started")
+        self._resume_task = asyncio.create_task(self._resume_outbox())
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Новые отправки отклоняем, начатые ждём до timeout секунд; прерванные сохраняются в outbox."""
+        self._accepting = False
+        if self.application is not None:
+            await self._stop_step("updater.stop", self.application.updater.stop)
+        tasks = list(self._inflight)
+        if tasks:
+            log.info("Waiting for %s in-flight send(s)", len(tasks))
+            _, pending = await asyncio.wait(tasks, timeout=max(0.0, timeout))
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._resume_task:
+            # неотправленное остаётся в файле возобновления outbox
+            self._resume_task.cancel()
+            await asyncio.gather(self._resume_task, return_exceptions=True)
+            self._resume_task = None
+        if self.application is not None:
+            await self._stop_step("application.stop", self.application.stop)
+            await self._stop_step("application.shutdown", self.application.shutdown)
+        log.info("Bot3 stopped")
+
+    @staticmethod
+    async def _stop_step(name: str, fn) -> None:
+        # ошибка одного шага не должна мешать остальным, но и теряться не должна
         try:
-            await self.application.stop()
+            await fn()
         except Exception:
-            pass
+            log.exception("Bot3 stop: %s failed", name)
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        # сеть/таймаут/лимиты и остановка — повторим позже; Forbidden, BadRequest и прочее — повтор не поможет
+        return isinstance(e, (NetworkError, RetryAfter, ShuttingDown)) and not isinstance(e, BadRequest)
+
+    async def _resume_outbox(self) -> None:
+        pending = self.outbox.take()
+        if not pending:
+            return
+        log.info("Resuming %s notification(s) interrupted by the previous shutdown", len(pending))
+        while pending and self._accepting:
+            for item in list(pending):
+                kind, params = item
+                try:
+                    if kind not in self.RESUMABLE:
+                        log.warning("Unknown outbox entry %s, dropped", kind)
+                    else:
+                        await getattr(self, kind)(**params)
+                except asyncio.CancelledError:
+                    # _track уже дописал эту отправку в outbox — из файла возобновления убираем, чтобы не задвоить
+                    pending.remove(item)
+                    self.outbox.keep(pending)
+                    raise
+                except Exception as e:
+                    if self._retryable(e):
+                        log.warning("Resumed %s %s failed, will retry: %s", kind, params, e)
+                        continue
+                    log.warning("Resumed %s %s failed, dropped: %s", kind, params, e)
+                pending.remove(item)
+                self.outbox.keep(pending)
+            if pending and self._accepting:
+                log.info("%s outbox notification(s) left, retrying in %ss", len(pending), settings.bot3_outbox_retry_sec)
+                await asyncio.sleep(settings.bot3_outbox_retry_sec)
+
+    async def _call(self, method: str, chat_id: int, **kwargs) -> Any:
+        """Все вызовы Bot API идут через лимиты Telegram; после RetryAfter — пауза и повтор."""
+        attempt = 0
+        while True:
+            await self.limiter.acquire(chat_id)
+            try:
+                return await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                if attempt > settings.tg_send_max_retries:
+                    raise
+                # в PTB 21 retry_after — int, в более новых — timedelta
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                self.limiter.block(float(delay))
+                log.warning("%s to %s: RetryAfter %ss, retrying (attempt %s)", method, chat_id, delay, attempt)
+
+    @contextmanager
+    def _track(self, kind: str, params: Dict[str, Any]):
+        if not self._accepting:
+            raise ShuttingDown("Bot3 is shutting down, retry later")
+        task = asyncio.current_task()
+        self._inflight[task] = kind
         try:
-            await self.application.shutdown()
-        except Exception:
-            pass
-        log.info("Bot3 stopped")
+            yield
+        except asyncio.CancelledError:
+            self.outbox.append(kind, params)
+            log.warning("%s interrupted by shutdown, saved to outbox", kind)
+            raise
+        finally:
+            self._inflight.pop(task, None)
 
     async def send_new_order(self, contractor_id: int, order_title: str, group_link: str) -> None:
         text = f"У вас новый заказ: {order_title}.\nПодробности в чате: {group_link}"
-        await self.application.bot.send_message(chat_id=contractor_id, text=text)
+        params = dict(contractor_id=contractor_id, order_title=order_title, group_link=group_link)
+        with self._track("send_new_order", params):
+            await self._call("send_message", chat_id=contractor_id, text=text)
 
     async def send_payment(self, contractor_id: int, amount_rub: int, order_id: str) -> None:
         text = f"Мы отправили вам {amount_rub} руб."
-        await self.application.bot.send_message(
-            chat_id=contractor_id,
-            text=text,
-            reply_markup=make_open_button(order_id, text="Открыть мини-приложение"),
-        )
+        with self._track("send_payment", dict(contractor_id=contractor_id, amount_rub=amount_rub, order_id=order_id)):
+            await self._call(
+                "send_message",
+                chat_id=contractor_id,
+                text=text,
+                reply_markup=make_open_button(order_id, text="Открыть мини-приложение"),
+            )
 
     async def pin_order_details(self, chat_id: int, order_id: str, title: Optional[str] = None) -> int:
         caption = "Детали заказа"
         if title:
             caption = f"Детали заказа: {title}"
 
-        msg = await self.application.bot.send_message(
-            chat_id=chat_id,
-            text=caption,
-            reply_markup=make_open_button(order_id, text="Детали заказа"),
-        )
+        # в outbox попадает только неотправленное сообщение: повтор после отправки дал бы дубль
+        with self._track("pin_order_details", dict(chat_id=chat_id, order_id=order_id, title=title)):
+            msg = await self._call(
+                "send_message",
+                chat_id=chat_id,
+                text=caption,
+                reply_markup=make_open_button(order_id, text="Детали заказа"),
+            )
         try:
-            await self.application.bot.pin_chat_message(
+            await self._call(
+                "pin_chat_message",
                 chat_id=chat_id,
                 message_id=msg.message_id,
                 disable_notification=True,
@@ -96,11 +224,13 @@ class Bot3:
         return msg.message_id
 
     async def send_raw(self, contractor_id: int, text: str, order_id: Optional[str] = None) -> None:
-        if order_id:
-            await self.application.bot.send_message(
-                chat_id=contractor_id,
-                text=text,
-                reply_markup=make_open_button(order_id, text="Открыть мини-приложение"),
-            )
-        else:
-            await self.application.bot.send_message(chat_id=contractor_id, text=text)
+        with self._track("send_raw", dict(contractor_id=contractor_id, text=text, order_id=order_id)):
+            if order_id:
+                await self._call(
+                    "send_message",
+                    chat_id=contractor_id,
+                    text=text,
+                    reply_markup=make_open_button(order_id, text="Открыть мини-приложение"),
+                )
+            else:
+                await self._call("send_message", chat_id=contractor_id, text=text)
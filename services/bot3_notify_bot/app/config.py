@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +10,36 @@ class Settings(BaseSettings):
     bot3_token: str
     bot3_username: str
     miniapp_public_url: str = "https://example.com"
+
+    # ptb — настоящий Bot API; fake — симулятор (app/fake_bot.py) для нагрузочных тестов без сети
+    bot3_backend: Literal["ptb", "fake"] = "ptb"
+    fake_tg_latency_ms: float = 50
+    fake_tg_jitter_ms: float = 30
+    fake_tg_flood_rate: float = 0.0
+    fake_tg_flood_wait_sec: int = 3
+    fake_tg_forbidden_rate: float = 0.0
+    fake_tg_seed: Optional[int] = None
+
+    # Детектор блокировок event loop'а: lag в /metrics, стек заблокировавшего кода — в лог
+    loop_monitor_enabled: bool = False
+    loop_monitor_interval_ms: float = 100
+    loop_monitor_threshold_ms: float = 250
+    # Лимиты Bot API на отправку (сообщений/с): общий, в личку, в группу; повторов после RetryAfter
+    tg_global_rate: float = 30
+    tg_chat_rate: float = 1
+    tg_group_rate: float = 20 / 60
+    tg_send_max_retries: int = 3
+
+    # Массовые рассылки (POST /api/broadcast): параллельных отправок на рассылку, сколько статусов хранить
+    broadcast_concurrency: int = 20
+    broadcast_keep_jobs: int = 100
+
+    # Остановка: сколько ждать начатые отправки; прерванные сохраняются в outbox и уходят после рестарта
+    shutdown_drain_sec: float = 20
+    bot3_outbox_path: str = "/data/bot3_outbox.jsonl"
+    # неотправленное из outbox (ошибка сети при старте) повторяем с этим интервалом, пока сервис работает
+    bot3_outbox_retry_sec: float = 30
+
     log_level: str = "INFO"
 
 
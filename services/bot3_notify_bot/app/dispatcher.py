@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .bot_runtime import Bot3
+from .schemas import BroadcastFailure, BroadcastStatus
+
+log = logging.getLogger("bot3.dispatcher")
+
+# Bot3-метод и его аргументы
+Call = Tuple[str, Dict[str, Any]]
+
+
+@dataclass
+class BroadcastJob:
+    id: str
+    kind: str
+    pending: Deque[Call]
+    total: int
+    status: str = "queued"
+    sent: int = 0
+    failed: int = 0
+    errors: Counter = field(default_factory=Counter)
+    failures: List[BroadcastFailure] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_status(self) -> BroadcastStatus:
+        return BroadcastStatus(
+            job_id=self.id,
+            kind=self.kind,
+            status=self.status,
+            total=self.total,
+            sent=self.sent,
+            failed=self.failed,
+            errors=dict(self.errors),
+            failures=self.failures,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+        )
+
+
+class BroadcastDispatcher:
+    """Массовые рассылки: concurrency параллельных отправок на задачу, темп задаёт SendLimiter бота.
+
+    Статус задач хранится в памяти (последние keep_jobs). При остановке неначатые отправки
+    уходят в outbox бота и будут отправлены после рестарта.
+    """
+
+    MAX_FAILURES = 200
+
+    def __init__(self, bot3: Bot3, concurrency: int, keep_jobs: int):
+        self.bot3 = bot3
+        self.concurrency = concurrency
+        self.keep_jobs = keep_jobs
+        self._jobs: "OrderedDict[str, BroadcastJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    def get(self, job_id: str) -> Optional[BroadcastJob]:
+        return self._jobs.get(job_id)
+
+    def submit(self, kind: str, calls: List[Call]) -> BroadcastJob:
+        if self._stopping:
+            raise RuntimeError("Bot3 is shutting down, retry later")
+        job = BroadcastJob(id=uuid.uuid4().hex, kind=kind, pending=deque(calls), total=len(calls))
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep_jobs:
+            old_id, old = next(iter(self._jobs.items()))
+            if old.finished_at is None:
+                break
+            del self._jobs[old_id]
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def stop(self) -> None:
+        """Новые рассылки не принимаем; неначатые отправки — в outbox. Начатые дожидается Bot3.stop."""
+        self._stopping = True
+        saved = 0
+        for job in self._jobs.values():
+            while job.pending:
+                method, params = job.pending.popleft()
+                self.bot3.outbox.append(method, params)
+                saved += 1
+        if saved:
+            log.info("Saved %s unsent broadcast message(s) to outbox", saved)
+
+    async def _run(self, job: BroadcastJob) -> None:
+        job.status = "running"
+        started = time.monotonic()
+        workers = [asyncio.create_task(self._worker(job)) for _ in range(max(1, min(self.concurrency, job.total)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            job.status = "interrupted" if self._stopping and job.sent + job.failed < job.total else "done"
+            job.finished_at = time.time()
+            log.info(
+                "Broadcast %s %s: %s sent, %s failed of %s in %.1fs",
+                job.id,
+                job.status,
+                job.sent,
+                job.failed,
+                job.total,
+                time.monotonic() - started,
+            )
+
+    async def _worker(self, job: BroadcastJob) -> None:
+        while job.pending and not self._stopping:
+            method, params = job.pending.popleft()
+            try:
+                await getattr(self.bot3, method)(**params)
+                job.sent += 1
+            except Exception as e:
+                job.failed += 1
+                job.errors[type(e).__name__] += 1
+                if len(job.failures) < self.MAX_FAILURES:
+                    job.failures.append(BroadcastFailure(contractor_id=params["contractor_id"], error=str(e)))
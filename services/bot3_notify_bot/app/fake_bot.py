@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+
+@dataclass
+class FakeOptions:
+    latency_ms: float = 50
+    jitter_ms: float = 30
+    # доля вызовов, на которые «Telegram» отвечает RetryAfter
+    flood_rate: float = 0.0
+    flood_wait_sec: int = 3
+    # доля пользователей, заблокировавших бота (Forbidden)
+    forbidden_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+class FakeBot:
+    """Замена telegram.Bot для нагрузочных тестов без сети (BOT3_BACKEND=fake).
+
+    Реализует методы, которые вызывает Bot3: задержка latency±jitter, RetryAfter с вероятностью
+    flood_rate, Forbidden для доли пользователей forbidden_rate (ответ по пользователю постоянен).
+    Отправленные сообщения хранятся в messages — их можно проверить в тестах.
+    """
+
+    def __init__(self, options: FakeOptions):
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.messages: Dict[Any, List[SimpleNamespace]] = {}
+        self.pinned: Dict[Any, int] = {}
+        self._message_ids = itertools.count(1)
+        self._forbidden: Dict[Any, bool] = {}
+
+    async def _sim(self) -> None:
+        o = self.options
+        await asyncio.sleep((o.latency_ms + self.rng.uniform(0, o.jitter_ms)) / 1000)
+        if o.flood_rate and self.rng.random() < o.flood_rate:
+            raise RetryAfter(o.flood_wait_sec)
+
+    def _blocked(self, chat_id: Any) -> bool:
+        # группы (отрицательные id) бота не блокируют
+        if not isinstance(chat_id, int) or chat_id < 0:
+            return False
+        if chat_id not in self._forbidden:
+            self._forbidden[chat_id] = self.rng.random() < self.options.forbidden_rate
+        return self._forbidden[chat_id]
+
+    async def send_message(self, chat_id: Any, text: str, reply_markup: Any = None, **kwargs):
+        await self._sim()
+        if self._blocked(chat_id):
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        msg = SimpleNamespace(
+            message_id=next(self._message_ids), chat_id=chat_id, text=text, reply_markup=reply_markup
+        )
+        self.messages.setdefault(chat_id, []).append(msg)
+        return msg
+
+    async def pin_chat_message(self, chat_id: Any, message_id: int, disable_notification: bool = False, **kwargs):
+        await self._sim()
+        if not any(m.message_id == message_id for m in self.messages.get(chat_id, ())):
+            raise BadRequest("Message to pin not found")
+        self.pinned[chat_id] = message_id
+        return True
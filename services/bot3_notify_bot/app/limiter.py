@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class _Bucket:
+    """Общий темп без запаса: слоты отправки идут через 1/rate друг за другом."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        # ближайший свободный слот (time.monotonic())
+        self.next_at = 0.0
+        # до этого момента отправка заблокирована RetryAfter'ом
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        """Резервирует слот; возвращает момент (time.monotonic()), когда можно отправлять."""
+        at = max(self.next_at, time.monotonic())
+        self.next_at = at + self.interval
+        return at
+
+    def block(self, until: float) -> None:
+        # очередь сдвигается за блокировку, а не упирается в неё: после паузы — снова по слоту на interval
+        self.blocked_until = max(self.blocked_until, until)
+        self.next_at = max(self.next_at, until)
+
+
+class _ChatGate:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self.next_at = 0.0
+
+
+class SendLimiter:
+    """Лимиты Bot API на отправку: общий (~30 сообщений/с) и на чат (1/с в личке, ~20/мин в группе).
+
+    Общий лимит — слоты через 1/rate (не больше rate за любую секунду); слот резервируется сразу,
+    поэтому параллельные отправки сами выстраиваются в очередь. В один чат отправки идут по очереди,
+    интервал отсчитывается от фактической отправки. После RetryAfter блокируется вся отправка (block).
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, group_rate: float, max_chats: int = 10000):
+        self._global = _Bucket(global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, _ChatGate]" = OrderedDict()
+
+    def _chat(self, chat_id: int) -> _ChatGate:
+        gate = self._chats.get(chat_id)
+        if gate is None:
+            # отрицательные id — группы
+            gate = self._chats[chat_id] = _ChatGate(1 / (self.group_rate if chat_id < 0 else self.chat_rate))
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return gate
+
+    async def acquire(self, chat_id: int) -> None:
+        gate = self._chat(chat_id)
+        async with gate.lock:
+            wait = gate.next_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            while True:
+                at = self._global.reserve()
+                wait = at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if self._global.blocked_until <= at:
+                    break
+                # пока ждали, пришёл RetryAfter — слот внутри блокировки пропадает, встаём в очередь заново
+            gate.next_at = time.monotonic() + gate.interval
+
+    def block(self, seconds: float) -> None:
+        self._global.block(time.monotonic() + seconds)
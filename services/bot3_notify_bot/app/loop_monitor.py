@@ -0,0 +1,142 @@
+# Общий модуль: одинаковые копии в bot1_userbot, bot3_notify_bot и miniapp (сервисы собираются
+# из своих каталогов и общего кода не имеют). Правится во всех трёх сразу; сервис-специфичны только
+# имя логгера и on_sample — их передаёт main.py.
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Dict, Optional
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_stack(frame) -> str:
+    stack = traceback.extract_stack(frame)
+    # кадры самого loop'а неинтересны — начинаем с выполняемого им колбэка
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i].name == "_run" and stack[i].filename.endswith("events.py"):
+            stack = stack[i + 1 :]
+            break
+    return "".join(traceback.format_list(stack))
+
+
+class LoopMonitor:
+    """Детектор блокировок event loop'а (LOOP_MONITOR_ENABLED).
+
+    Пульс-корутина засыпает на interval_sec и меряет, насколько позже проснулась, — это lag loop'а.
+    Поток-сторож следит за пульсом: если loop молчит дольше threshold_ms, снимает стек потока loop'а
+    (в нём и выполняется заблокировавший колбэк, например синхронный вызов в обработчике) и пишет в лог.
+    on_sample(lag_sec, blocked) вызывается на каждый замер — для выгрузки в свой реестр метрик.
+    """
+
+    def __init__(
+        self,
+        interval_sec: float,
+        threshold_ms: float,
+        window: int = 3000,
+        logger: str = "loop",
+        on_sample: Optional[Callable[[float, bool], None]] = None,
+    ):
+        self.interval_sec = interval_sec
+        self.threshold_sec = threshold_ms / 1000
+        self.samples: deque = deque(maxlen=window)
+        self.blocked = 0
+        self.log = logging.getLogger(logger)
+        self.on_sample = on_sample
+        self.lag_sum = 0.0
+        self.lag_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._pulse())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        self.log.info(
+            "Event loop monitor started (interval=%.0fms, threshold=%.0fms)",
+            self.interval_sec * 1000,
+            self.threshold_sec * 1000,
+        )
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog:
+            await asyncio.to_thread(self._watchdog.join, 1)
+            self._watchdog = None
+
+    async def _pulse(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval_sec)
+            lag = max(0.0, time.monotonic() - self._beat - self.interval_sec)
+            self.samples.append(lag)
+            self.lag_sum += lag
+            self.lag_count += 1
+            blocked = lag >= self.threshold_sec
+            if blocked:
+                self.blocked += 1
+                self.log.warning("Event loop lag %.0fms", lag * 1000)
+            if self.on_sample:
+                self.on_sample(lag, blocked)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold_sec / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval_sec
+            if stalled < self.threshold_sec or beat == reported:
+                continue
+            # один стек на одну блокировку
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            self.log.warning(
+                "Event loop blocked for %.0fms+ in task %s:\n%s",
+                stalled * 1000,
+                task.get_name() if task else None,
+                _format_stack(frame),
+            )
+
+    def percentiles(self) -> Dict[float, float]:
+        values = sorted(self.samples)
+        if not values:
+            return {q: 0.0 for q in QUANTILES}
+        # nearest-rank, как в services/scripts/loadgen.py
+        n = len(values)
+        return {q: values[max(0, min(n - 1, math.ceil(q * n) - 1))] for q in QUANTILES}
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (summary по последним window замерам)."""
+        lines = ["# TYPE event_loop_lag_seconds summary"]
+        lines += [f'event_loop_lag_seconds{{quantile="{q}"}} {v:g}' for q, v in self.percentiles().items()]
+        lines += [
+            f"event_loop_lag_seconds_sum {self.lag_sum:g}",
+            f"event_loop_lag_seconds_count {self.lag_count}",
+            "# TYPE event_loop_lag_seconds_max gauge",
+            f"event_loop_lag_seconds_max {max(self.samples, default=0.0):g}",
+            "# TYPE event_loop_blocked_total counter",
+            f"event_loop_blocked_total {self.blocked}",
+        ]
+        return "\n".join(lines) + "\n"
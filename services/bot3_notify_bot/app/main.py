@@ -1,30 +1,50 @@
 import asyncio
 import logging
+import re
+from typing import Any, Dict, List
 from urllib.parse import quote
 
-from fastapi import FastAPI, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Form, HTTPException
+from pydantic import ValidationError
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from telegram.error import Forbidden
 
 from .bot_runtime import Bot3
 from .config import settings
+from .dispatcher import BroadcastDispatcher, Call
+from .schemas import BROADCAST_PARAMS, BroadcastRequest, BroadcastStatus
+from .loop_monitor import LoopMonitor
 
 logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.INFO))
 log = logging.getLogger("bot3")
 
 bot3 = Bot3()
+dispatcher = BroadcastDispatcher(
+    bot3, concurrency=settings.broadcast_concurrency, keep_jobs=settings.broadcast_keep_jobs
+)
+loop_monitor = (
+    LoopMonitor(settings.loop_monitor_interval_ms / 1000, settings.loop_monitor_threshold_ms, logger="bot3.loop")
+    if settings.loop_monitor_enabled
+    else None
+)
 app = FastAPI(title="Bot3 Web UI", version="2.0.0")
 
 
 @app.on_event("startup")
 async def _startup():
+    if loop_monitor:
+        loop_monitor.start()
     # Run bot polling in background task
     asyncio.create_task(bot3.start())
 
 
 @app.on_event("shutdown")
 async def _shutdown():
-    await bot3.stop()
+    # HTTP-запросы uvicorn к этому моменту уже отменил (--timeout-graceful-shutdown) — их отправки в outbox
+    await dispatcher.stop()
+    await bot3.stop(timeout=settings.shutdown_drain_sec)
+    if loop_monitor:
+        await loop_monitor.stop()
 
 
 @app.get("/health")
@@ -36,6 +56,58 @@ async def health():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(loop_monitor.render() if loop_monitor else "")
+
+
+_TEMPLATE_VAR = re.compile(r"\{(\w+)\}")
+
+
+def _render(text: str, variables: Dict[str, Any]) -> str:
+    # только {имя}: без format-спецификаций и доступа к атрибутам; неизвестные переменные остаются как есть
+    return _TEMPLATE_VAR.sub(lambda m: str(variables.get(m.group(1), m.group(0))), text)
+
+
+def _broadcast_calls(req: BroadcastRequest) -> List[Call]:
+    model = BROADCAST_PARAMS[req.kind]
+    calls: List[Call] = []
+    for r in req.recipients:
+        p = {**req.params, **r.params, "contractor_id": r.contractor_id}
+        try:
+            params = model.model_validate(p).model_dump()
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            raise HTTPException(status_code=422, detail=f"contractor {r.contractor_id}: {errors}")
+        if req.kind == "new_order":
+            calls.append(("send_new_order", {"contractor_id": r.contractor_id, **params}))
+        elif req.kind == "payment":
+            calls.append(("send_payment", {"contractor_id": r.contractor_id, **params}))
+        else:
+            params["text"] = _render(params["text"], p)
+            params["order_id"] = params["order_id"] or None
+            calls.append(("send_raw", {"contractor_id": r.contractor_id, **params}))
+    return calls
+
+
+@app.post("/api/broadcast", response_model=BroadcastStatus)
+async def broadcast(req: BroadcastRequest):
+    """Рассылка сотням подрядчиков в фоне в пределах лимитов Telegram; статус — GET /api/broadcast/{job_id}."""
+    try:
+        job = dispatcher.submit(req.kind, _broadcast_calls(req))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.to_status()
+
+
+@app.get("/api/broadcast/{job_id}", response_model=BroadcastStatus)
+async def broadcast_status(job_id: str):
+    job = dispatcher.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Broadcast job not found")
+    return job.to_status()
+
+
 def _page(message: str | None = None, error: str | None = None) -> str:
     msg_html = ""
     if message:
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+log = logging.getLogger("bot3.outbox")
+
+
+class Outbox:
+    """Уведомления, прерванные остановкой сервиса (JSONL-файл): дописываются при отмене, отправляются при старте.
+
+    При старте записи переносятся в файл возобновления (<path>.resuming) и удаляются из него только после отправки,
+    так что сбой посреди повторной отправки ничего не теряет.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.resume_path = path + ".resuming"
+        self._lock = threading.Lock()
+
+    def append(self, kind: str, params: Dict[str, Any]) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"kind": kind, "params": params}, ensure_ascii=False) + "\n")
+
+    def take(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Записи к отправке: недоотправленные прошлым запуском + новые. Новые переносятся в файл возобновления."""
+        with self._lock:
+            items = self._read(self.resume_path) + self._read(self.path)
+            self._write(self.resume_path, items)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        return items
+
+    def keep(self, items: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Оставляет в файле возобновления только items (ещё не отправленные)."""
+        with self._lock:
+            self._write(self.resume_path, items)
+
+    @staticmethod
+    def _read(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        items = []
+        for line in lines:
+            try:
+                row = json.loads(line)
+                items.append((row["kind"], row["params"]))
+            except (ValueError, KeyError):
+                # недописанная строка — остановку прервали посреди записи
+                log.warning("Skipping broken outbox line: %r", line)
+        return items
+
+    @staticmethod
+    def _write(path: str, items: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if not items:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for kind, params in items:
+                f.write(json.dumps({"kind": kind, "params": params}, ensure_ascii=False) + "\n")
+        # атомарная замена: файл всегда либо старый, либо новый целиком
+        os.replace(tmp, path)
@@ -0,0 +1,57 @@
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class BroadcastRecipient(BaseModel):
+    contractor_id: int
+    # переопределяют общие params для этого получателя (и подставляются в шаблон текста)
+    params: Dict[str, Any] = {}
+
+
+class BroadcastRequest(BaseModel):
+    # new_order: order_title, group_link; payment: amount_rub, order_id; raw: text (шаблон {var}), order_id опционально
+    kind: Literal["new_order", "payment", "raw"]
+    params: Dict[str, Any] = {}
+    recipients: List[BroadcastRecipient] = Field(min_length=1)
+
+
+class _BroadcastParams(BaseModel):
+    # числовые id/названия из CRM принимаем как строки; лишние ключи — переменные шаблона
+    model_config = ConfigDict(coerce_numbers_to_str=True, extra="ignore")
+
+
+class NewOrderParams(_BroadcastParams):
+    order_title: str = Field(min_length=1)
+    group_link: str = Field(min_length=1)
+
+
+class PaymentParams(_BroadcastParams):
+    amount_rub: int
+    order_id: str = Field(min_length=1)
+
+
+class RawParams(_BroadcastParams):
+    text: str = Field(min_length=1)
+    order_id: Optional[str] = None
+
+
+BROADCAST_PARAMS = {"new_order": NewOrderParams, "payment": PaymentParams, "raw": RawParams}
+
+
+class BroadcastFailure(BaseModel):
+    contractor_id: int
+    error: str
+
+
+class BroadcastStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued | running | done | interrupted
+    total: int
+    sent: int
+    failed: int
+    errors: Dict[str, int] = {}
+    failures: List[BroadcastFailure] = []
+    created_at: float
+    finished_at: Optional[float] = None
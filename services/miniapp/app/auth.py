@@ -3,11 +3,12 @@ from __future__ import annotations
 import hmac
 import hashlib
 import json
+import time
 from datetime import datetime, timezone
 from typing import Dict, Tuple, Optional
 from urllib.parse import parse_qsl
 
-from fastapi import Header, HTTPException, Request
+from fastapi import Header, HTTPException, Query, Request
 
 from .config import settings
 
@@ -64,3 +65,42 @@ async def get_current_contractor_id(
         raise HTTPException(status_code=401, detail="Missing initData (use X-Telegram-Init-Data header)")
     user = _check_telegram_webapp_signature(init_data, settings.bot3_token)
     return int(user["id"])
+
+
+def _download_sig(file_id: int, contractor_id: int, expires: int) -> str:
+    key = hmac.new(b"FileDownload", settings.bot3_token.encode("utf-8"), hashlib.sha256).digest()
+    return hmac.new(key, f"{file_id}:{contractor_id}:{expires}".encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def make_download_token(file_id: int, contractor_id: int) -> str:
+    """Короткоживущая подпись прямой ссылки на файл — initData в URL осел бы в логах, прокси и истории браузера."""
+    ttl = settings.files_download_token_ttl_sec
+    # срок округлён до окна ttl: в его пределах ссылка не меняется и кэш браузера продолжает работать
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return f"{contractor_id}.{expires}.{_download_sig(file_id, contractor_id, expires)}"
+
+
+def check_download_token(token: str, file_id: int) -> int:
+    try:
+        contractor_raw, expires_raw, sig = token.split(".")
+        contractor_id, expires = int(contractor_raw), int(expires_raw)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Bad download token")
+    if not hmac.compare_digest(sig, _download_sig(file_id, contractor_id, expires)):
+        raise HTTPException(status_code=401, detail="Bad download token")
+    if expires < time.time():
+        raise HTTPException(status_code=401, detail="Download link expired, reopen the order")
+    return contractor_id
+
+
+async def get_download_contractor_id(
+    request: Request,
+    file_id: int,
+    token: Optional[str] = Query(None),
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    x_debug_user_id: Optional[str] = Header(None, alias="X-Debug-User-Id"),
+) -> int:
+    # ссылки из деталей заказа подписаны token'ом; без него — обычная авторизация заголовками
+    if token:
+        return check_download_token(token, file_id)
+    return await get_current_contractor_id(request, x_telegram_init_data, x_debug_user_id)
@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,6 +11,28 @@ class Settings(BaseSettings):
     crm_api_key: str
     telegram_auth_disabled: bool = False
 
+    # Локальное хранилище вложений (скачиваются по url из upsert заказа)
+    files_ingest_enabled: bool = False
+    files_store_dir: str = "/data/files"
+    files_max_mb: int = 100
+    # срок жизни подписанных ссылок на скачивание (download_url) — от ttl до 2*ttl
+    files_download_token_ttl_sec: int = Field(900, gt=0)
+
+    # Rate limiting / load shedding для /api/app и /api/crm
+    rate_limit_enabled: bool = True
+    rate_limit_app_per_sec: float = Field(5.0, gt=0)
+    rate_limit_app_burst: float = Field(20.0, ge=1)
+    rate_limit_crm_per_sec: float = Field(50.0, gt=0)
+    rate_limit_crm_burst: float = Field(200.0, ge=1)
+    # сколько ключей (подрядчиков / IP) помнит каждый лимитер; самые давние вытесняются
+    rate_limit_max_keys: int = Field(10000, gt=0)
+    max_inflight_requests: int = Field(64, gt=0)
+
+    # Детектор блокировок event loop'а: lag в /metrics, стек заблокировавшего кода — в лог
+    loop_monitor_enabled: bool = False
+    loop_monitor_interval_ms: float = 100
+    loop_monitor_threshold_ms: float = 250
+
     log_level: str = "INFO"
 
 
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from . import models
-from .schemas import OrderUpsertRequest, ContractorUpdateCRMRequest
+from .membership import membership
+from .schemas import OrderUpsertRequest, ContractorUpdateCRMRequest, ContractorBulkUpdateItem
+
+_CONTRACTOR_CRM_FIELDS = ("advance_amount", "contact_info", "payment_info")
+# SQLite ограничивает число параметров в одном запросе
+_IN_CHUNK = 500
 
 
 def get_or_create_contractor(db: Session, tg_id: int) -> models.Contractor:
@@ -63,6 +69,8 @@ def upsert_order(db: Session, payload: OrderUpsertRequest) -> models.Order:
 
     # replace stages if provided (CRM may send full list)
     db.execute(delete(models.Stage).where(models.Stage.order_id == order.order_id))
+    db.execute(delete(models.StageDailyRollup).where(models.StageDailyRollup.order_id == order.order_id))
+    rollups: Dict[tuple, List[int]] = {}
     for s in payload.stages:
         dt = s.date or datetime.utcnow()
         contractor_id = s.contractor_id or (contractor_ids[0] if contractor_ids else 0)
@@ -78,8 +86,25 @@ def upsert_order(db: Session, payload: OrderUpsertRequest) -> models.Order:
                 comment=s.comment,
             )
         )
+        acc = rollups.setdefault((contractor_id, dt.date()), [0, 0, 0])
+        acc[0] += s.hours or 0
+        acc[1] += s.amount or 0
+        acc[2] += 1
+
+    for (contractor_id, day), (hours, amount, count) in rollups.items():
+        db.add(
+            models.StageDailyRollup(
+                order_id=order.order_id,
+                contractor_id=contractor_id,
+                day=day,
+                hours=hours,
+                amount=amount,
+                stages_count=count,
+            )
+        )
 
     db.flush()
+    membership.defer_set_order(db, order.order_id, contractor_ids)
     return order
 
 
@@ -88,6 +113,7 @@ def delete_order(db: Session, order_id: str) -> None:
     if order:
         db.delete(order)
         db.flush()
+    membership.defer_remove_order(db, order_id)
 
 
 def update_contractor_from_crm(db: Session, tg_id: int, payload: ContractorUpdateCRMRequest) -> models.Contractor:
@@ -102,6 +128,168 @@ def update_contractor_from_crm(db: Session, tg_id: int, payload: ContractorUpdat
     return c
 
 
+def bulk_update_contractors_from_crm(db: Session, items: List[ContractorBulkUpdateItem]) -> List[Dict]:
+    # Схлопываем повторы tg_id: поля более поздних элементов перекрывают ранние
+    merged: Dict[int, Dict] = {}
+    for item in items:
+        row = merged.setdefault(item.tg_id, {"tg_id": item.tg_id})
+        for field in _CONTRACTOR_CRM_FIELDS:
+            value = getattr(item, field)
+            if value is not None:
+                row[field] = value
+    if not merged:
+        return []
+
+    ids = list(merged)
+    existing = set()
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[i:i + _IN_CHUNK]
+        existing.update(db.execute(select(models.Contractor.tg_id).where(models.Contractor.tg_id.in_(chunk))).scalars())
+
+    # Один INSERT ... ON CONFLICT DO UPDATE (executemany) на каждый набор переданных полей,
+    # чтобы не затирать поля, которые CRM не присылала
+    groups: Dict[tuple, List[Dict]] = {}
+    for row in merged.values():
+        fields = tuple(f for f in _CONTRACTOR_CRM_FIELDS if f in row)
+        groups.setdefault(fields, []).append(row)
+
+    table = models.Contractor.__table__
+    for fields, rows in groups.items():
+        stmt = sqlite_insert(table)
+        if fields:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.tg_id],
+                set_={f: stmt.excluded[f] for f in fields},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.tg_id])
+        # advance_amount NOT NULL без server default — для новых строк подставляем 0
+        db.execute(stmt, [{"advance_amount": 0, **r} if "advance_amount" not in r else r for r in rows])
+
+    # Результат на каждый элемент по порядку; при повторах tg_id создан только первый, остальные — обновление
+    results = []
+    for item in items:
+        results.append({"tg_id": item.tg_id, "ok": True, "created": item.tg_id not in existing})
+        existing.add(item.tg_id)
+    return results
+
+
+def add_stage_to_rollup(db: Session, stage: models.Stage) -> None:
+    table = models.StageDailyRollup.__table__
+    stmt = sqlite_insert(table).values(
+        order_id=stage.order_id,
+        contractor_id=stage.contractor_id,
+        day=stage.date.date(),
+        hours=stage.hours or 0,
+        amount=stage.amount or 0,
+        stages_count=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.order_id, table.c.contractor_id, table.c.day],
+        set_={
+            "hours": table.c.hours + stmt.excluded.hours,
+            "amount": table.c.amount + stmt.excluded.amount,
+            "stages_count": table.c.stages_count + stmt.excluded.stages_count,
+        },
+    )
+    db.execute(stmt)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Полный пересчёт rollup-таблицы из stages (для БД, созданных до её появления)."""
+    day = func.date(models.Stage.date)
+    rows = db.execute(
+        select(
+            models.Stage.order_id,
+            models.Stage.contractor_id,
+            day,
+            func.coalesce(func.sum(models.Stage.hours), 0),
+            func.coalesce(func.sum(models.Stage.amount), 0),
+            func.count(),
+        ).group_by(models.Stage.order_id, models.Stage.contractor_id, day)
+    ).all()
+    db.execute(delete(models.StageDailyRollup))
+    for order_id, contractor_id, d, hours, amount, count in rows:
+        db.add(
+            models.StageDailyRollup(
+                order_id=order_id,
+                contractor_id=contractor_id,
+                day=date.fromisoformat(d),
+                hours=hours,
+                amount=amount,
+                stages_count=count,
+            )
+        )
+    db.flush()
+    return len(rows)
+
+
+def rollups_missing(db: Session) -> bool:
+    has_stages = db.execute(select(models.Stage.id).limit(1)).first() is not None
+    has_rollups = db.execute(select(models.StageDailyRollup.id).limit(1)).first() is not None
+    return has_stages and not has_rollups
+
+
+def hours_report(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    group_by: Sequence[str],
+    order_id: Optional[str] = None,
+    contractor_id: Optional[int] = None,
+) -> List[Dict]:
+    """Агрегаты по rollup-таблице; group_by — подмножество {order, contractor, day, week, month}."""
+    r = models.StageDailyRollup
+    period = next((g for g in ("day", "week", "month") if g in group_by), None)
+    cols = []
+    if "order" in group_by:
+        cols.append(r.order_id)
+    if "contractor" in group_by:
+        cols.append(r.contractor_id)
+    if period:
+        cols.append(r.day)
+
+    stmt = select(
+        *cols,
+        func.sum(r.hours),
+        func.sum(r.amount),
+        func.sum(r.stages_count),
+    ).where(r.day >= date_from, r.day <= date_to)
+    if order_id is not None:
+        stmt = stmt.where(r.order_id == order_id)
+    if contractor_id is not None:
+        stmt = stmt.where(r.contractor_id == contractor_id)
+    if cols:
+        stmt = stmt.group_by(*cols)
+
+    # Недели/месяцы досворачиваем из дневных строк в Python — их немного
+    out: Dict[tuple, Dict] = {}
+    for row in db.execute(stmt).all():
+        values = list(row[: len(cols)])
+        hours, amount, count = row[len(cols):]
+        item: Dict = {}
+        if "order" in group_by:
+            item["order_id"] = values.pop(0)
+        if "contractor" in group_by:
+            item["contractor_id"] = values.pop(0)
+        if period:
+            d: date = values.pop(0)
+            if period == "week":
+                d = d - timedelta(days=d.weekday())
+            elif period == "month":
+                d = d.replace(day=1)
+            item["period"] = d
+        key = tuple(item.values())
+        acc = out.get(key)
+        if acc is None:
+            acc = out[key] = {**item, "hours": 0, "amount": 0, "stages_count": 0}
+        acc["hours"] += hours or 0
+        acc["amount"] += amount or 0
+        acc["stages_count"] += count or 0
+
+    return [out[key] for key in sorted(out)]
+
+
 def list_orders_for_contractor(db: Session, tg_id: int) -> List[models.Order]:
     stmt = (
         select(models.Order)
@@ -113,9 +301,7 @@ def list_orders_for_contractor(db: Session, tg_id: int) -> List[models.Order]:
 
 
 def get_order_for_contractor(db: Session, order_id: str, tg_id: int) -> Optional[models.Order]:
-    stmt = (
-        select(models.Order)
-        .join(models.OrderContractor, models.Order.order_id == models.OrderContractor.order_id)
-        .where(models.Order.order_id == order_id, models.OrderContractor.contractor_id == tg_id)
-    )
-    return db.execute(stmt).scalars().first()
+    # Проверка доступа — по индексу в памяти, в БД идём только за самим заказом
+    if not membership.has(tg_id, order_id):
+        return None
+    return db.get(models.Order, order_id)
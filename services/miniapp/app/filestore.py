@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import httpx
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+
+from . import models
+from .config import settings
+from .db import SessionLocal
+
+log = logging.getLogger("miniapp.files")
+
+CHUNK = 1024 * 1024
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+class BlobStore:
+    """Content-addressed хранилище: <root>/<sha[:2]>/<sha256>. Одинаковое содержимое хранится один раз."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def put_stream(self, chunks: Iterable[bytes]) -> Tuple[str, int]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        h = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".ingest-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise FileTooLarge(f"File exceeds {self.max_bytes} bytes")
+                    h.update(chunk)
+                    f.write(chunk)
+            sha256 = h.hexdigest()
+            dst = self.path_for(sha256)
+            if dst.exists():
+                os.unlink(tmp)
+            else:
+                dst.parent.mkdir(exist_ok=True)
+                os.replace(tmp, dst)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+store = BlobStore(settings.files_store_dir, settings.files_max_mb * 1024 * 1024)
+
+
+def _download(client: httpx.Client, url: str) -> Tuple[str, int, Optional[str]]:
+    with client.stream("GET", url) as r:
+        r.raise_for_status()
+        content_type = r.headers.get("content-type")
+        sha256, size = store.put_stream(r.iter_bytes(CHUNK))
+    return sha256, size, content_type
+
+
+def ingest_urls(urls: Iterable[str]) -> None:
+    """Скачивает в локальное хранилище ещё не сохранённые URL (запускается как background task)."""
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return
+    with SessionLocal() as db:
+        known = set(db.execute(select(models.StoredFile.url).where(models.StoredFile.url.in_(urls))).scalars())
+        missing = [u for u in urls if u not in known]
+        if not missing:
+            return
+        with httpx.Client(timeout=60, follow_redirects=True) as client:
+            for url in missing:
+                try:
+                    sha256, size, content_type = _download(client, url)
+                except Exception as e:
+                    log.warning("Failed ingesting %s: %s", url, e)
+                    continue
+                db.merge(models.StoredFile(url=url, sha256=sha256, size=size, content_type=content_type))
+                db.commit()
+                log.info("Ingested %s -> %s (%s bytes)", url, sha256, size)
+
+
+class BlobResponse(FileResponse):
+    """FileResponse с ETag по хешу содержимого (Range-запросы обрабатывает базовый FileResponse)."""
+
+    def __init__(self, path: os.PathLike, sha256: str, **kwargs):
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["etag"] = f'"{sha256}"'
+        headers.setdefault("cache-control", "private, max-age=86400, immutable")
+        super().__init__(path, headers=headers, **kwargs)
+
+
+def etag_matches(if_none_match: Optional[str], sha256: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or f'"{sha256}"' in tags
@@ -2,17 +2,28 @@ import logging
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from .config import settings
-from .db import init_db
+from . import crud
+from .db import init_db, SessionLocal
+from .loop_monitor import LoopMonitor
+from .membership import membership
+from .ratelimit import rate_limit_middleware
 from .routers import crm, app_api
 
 logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.INFO))
 log = logging.getLogger("miniapp")
 
+loop_monitor = (
+    LoopMonitor(settings.loop_monitor_interval_ms / 1000, settings.loop_monitor_threshold_ms, logger="miniapp.loop")
+    if settings.loop_monitor_enabled
+    else None
+)
+
 app = FastAPI(title="Miniapp Backend", version="1.0.0")
+app.middleware("http")(rate_limit_middleware)
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
@@ -20,8 +31,23 @@ STATIC_DIR = BASE_DIR / "static"
 
 @app.on_event("startup")
 async def _startup():
+    if loop_monitor:
+        loop_monitor.start()
     init_db()
     log.info("DB ready at %s", settings.db_path)
+    with SessionLocal() as db:
+        n = membership.load(db)
+        log.info("Membership index loaded: %s order/contractor links", n)
+        if crud.rollups_missing(db):
+            n = crud.rebuild_rollups(db)
+            db.commit()
+            log.info("Stage daily rollups rebuilt: %s rows", n)
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    if loop_monitor:
+        await loop_monitor.stop()
 
 
 app.include_router(crm.router)
@@ -38,3 +64,8 @@ async def index():
 @app.get("/health")
 async def health():
     return {"ok": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(loop_monitor.render() if loop_monitor else "")
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Iterable, Set
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+class MembershipIndex:
+    """In-process index contractor tg_id -> set of order_id.
+
+    Используется только для проверки доступа подрядчика к заказу, чтобы не делать
+    join orders/order_contractors на каждый запрос миниаппа. Загружается из БД на
+    старте и обновляется из crud.upsert_order / crud.delete_order — через defer_*, только после
+    успешного commit'а сессии (при rollback изменения отбрасываются).
+    Рассчитан на один процесс uvicorn (как в Dockerfile).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_contractor: Dict[int, Set[str]] = {}
+        self._by_order: Dict[str, Set[int]] = {}
+
+    def load(self, db: Session) -> int:
+        rows = db.execute(select(models.OrderContractor.order_id, models.OrderContractor.contractor_id)).all()
+        by_contractor: Dict[int, Set[str]] = {}
+        by_order: Dict[str, Set[int]] = {}
+        for order_id, contractor_id in rows:
+            by_contractor.setdefault(contractor_id, set()).add(order_id)
+            by_order.setdefault(order_id, set()).add(contractor_id)
+        with self._lock:
+            self._by_contractor = by_contractor
+            self._by_order = by_order
+        return len(rows)
+
+    def has(self, contractor_id: int, order_id: str) -> bool:
+        orders = self._by_contractor.get(contractor_id)
+        return orders is not None and order_id in orders
+
+    def set_order(self, order_id: str, contractor_ids: Iterable[int]) -> None:
+        new = set(contractor_ids)
+        with self._lock:
+            old = self._by_order.get(order_id, set())
+            for cid in old - new:
+                orders = self._by_contractor.get(cid)
+                if orders is not None:
+                    orders.discard(order_id)
+                    if not orders:
+                        del self._by_contractor[cid]
+            for cid in new - old:
+                self._by_contractor.setdefault(cid, set()).add(order_id)
+            if new:
+                self._by_order[order_id] = new
+            else:
+                self._by_order.pop(order_id, None)
+
+    def remove_order(self, order_id: str) -> None:
+        self.set_order(order_id, ())
+
+    def defer_set_order(self, db: Session, order_id: str, contractor_ids: Iterable[int]) -> None:
+        """set_order после commit'а транзакции db."""
+        db.info.setdefault(_PENDING, []).append((order_id, set(contractor_ids)))
+
+    def defer_remove_order(self, db: Session, order_id: str) -> None:
+        self.defer_set_order(db, order_id, ())
+
+
+membership = MembershipIndex()
+
+# ключ в Session.info: изменения индекса, ждущие commit'а
+_PENDING = "membership_pending"
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    for order_id, contractor_ids in session.info.pop(_PENDING, ()):
+        membership.set_order(order_id, contractor_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 
 from sqlalchemy import (
     String,
     Integer,
     Boolean,
+    Date,
     DateTime,
     ForeignKey,
     Text,
@@ -44,6 +45,7 @@ class Order(Base):
     stages: Mapped[List["Stage"]] = relationship(back_populates="order", cascade="all, delete-orphan")
     files: Mapped[List["OrderFile"]] = relationship(back_populates="order", cascade="all, delete-orphan")
     properties: Mapped[List["PropertyItem"]] = relationship(back_populates="order", cascade="all, delete-orphan")
+    rollups: Mapped[List["StageDailyRollup"]] = relationship(cascade="all, delete-orphan")
 
 
 class OrderContractor(Base):
@@ -84,6 +86,18 @@ class OrderFile(Base):
     order: Mapped["Order"] = relationship(back_populates="files")
 
 
+class StoredFile(Base):
+    """Локальная копия внешнего файла (url -> содержимое в content-addressed хранилище)."""
+
+    __tablename__ = "stored_files"
+
+    url: Mapped[str] = mapped_column(Text, primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    content_type: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class PropertyItem(Base):
     __tablename__ = "property_items"
 
@@ -96,3 +110,19 @@ class PropertyItem(Base):
     comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     order: Mapped["Order"] = relationship(back_populates="properties")
+
+
+class StageDailyRollup(Base):
+    """Суммы по этапам за день (order, contractor, day); поддерживаются инкрементально из crud."""
+
+    __tablename__ = "stage_daily_rollups"
+    __table_args__ = (UniqueConstraint("order_id", "contractor_id", "day", name="uq_stage_rollup"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    order_id: Mapped[str] = mapped_column(ForeignKey("orders.order_id", ondelete="CASCADE"), index=True)
+    contractor_id: Mapped[int] = mapped_column(Integer, index=True, nullable=False)
+    day: Mapped[date] = mapped_column(Date, index=True, nullable=False)
+
+    hours: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    amount: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    stages_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from .auth import _check_telegram_webapp_signature
+from .config import settings
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Берёт один токен. Возвращает 0, если можно, иначе сколько секунд ждать."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Набор token bucket'ов по ключу (подрядчик / CRM-ключ); хранит не больше max_keys, самые давние вытесняются."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # bucket, простоявший дольше времени полного восстановления, ничем не отличается от нового
+        self.idle_sec = burst / rate
+        self._lock = threading.Lock()
+        # порядок — от давно не использованных к недавним
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def hit(self, key: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._evict(now)
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+    def _evict(self, now: float) -> None:
+        # простоявшие — без потерь; при переполнении и живые, начиная с самого давнего
+        while self._buckets:
+            oldest = next(iter(self._buckets.values()))
+            if len(self._buckets) < self.max_keys and now - oldest.updated < self.idle_sec:
+                break
+            self._buckets.popitem(last=False)
+
+
+app_limiter = RateLimiter(settings.rate_limit_app_per_sec, settings.rate_limit_app_burst, settings.rate_limit_max_keys)
+crm_limiter = RateLimiter(settings.rate_limit_crm_per_sec, settings.rate_limit_crm_burst, settings.rate_limit_max_keys)
+
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+
+def _client_key(request: Request) -> Optional[Tuple[RateLimiter, str]]:
+    path = request.url.path
+    if path.startswith("/api/crm"):
+        api_key = request.headers.get("X-CRM-API-Key", "")
+        return crm_limiter, "crm:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    if path.startswith("/api/app"):
+        contractor_id = _contractor_id(request)
+        if contractor_id is not None:
+            return app_limiter, f"tg:{contractor_id}"
+        host = request.client.host if request.client else "unknown"
+        return app_limiter, f"ip:{host}"
+    return None
+
+
+def _contractor_id(request: Request) -> Optional[int]:
+    try:
+        if settings.telegram_auth_disabled:
+            return int(request.headers.get("X-Debug-User-Id", ""))
+        init_data = request.headers.get("X-Telegram-Init-Data") or request.query_params.get("initData")
+        if not init_data:
+            return None
+        user = _check_telegram_webapp_signature(init_data, settings.bot3_token)
+        return int(user["id"])
+    except (HTTPException, ValueError, KeyError, TypeError):
+        # невалидная авторизация — ответит сам эндпоинт, лимитируем по IP
+        return None
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def rate_limit_middleware(request: Request, call_next):
+    global _inflight
+
+    if not settings.rate_limit_enabled:
+        return await call_next(request)
+
+    target = _client_key(request)
+    if target is None:
+        return await call_next(request)
+
+    limiter, key = target
+    wait = limiter.hit(key)
+    if wait > 0:
+        return _reject(429, "Too many requests", wait)
+
+    with _inflight_lock:
+        if _inflight >= settings.max_inflight_requests:
+            return _reject(503, "Server overloaded, retry later", 1)
+        _inflight += 1
+    try:
+        return await call_next(request)
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
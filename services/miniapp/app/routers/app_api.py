@@ -1,12 +1,16 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from ..auth import get_current_contractor_id
+from ..auth import get_current_contractor_id, get_download_contractor_id, make_download_token
 from ..deps import get_db
-from .. import crud, models
+from .. import crud, filestore, models
+from ..membership import membership
 from ..schemas import (
     MeResponse,
     ContractorOut,
@@ -78,6 +82,13 @@ def order_details(
         .scalars()
         .all()
     )
+    stored_urls = set()
+    if files:
+        stored_urls = set(
+            db.execute(select(models.StoredFile.url).where(models.StoredFile.url.in_([f.url for f in files])))
+            .scalars()
+            .all()
+        )
     props = (
         db.execute(
             select(models.PropertyItem)
@@ -103,11 +114,52 @@ def order_details(
             )
             for s in stages
         ],
-        files=[FileOut(id=f.id, name=f.name, url=f.url) for f in files],
+        files=[
+            FileOut(
+                id=f.id,
+                name=f.name,
+                url=f.url,
+                download_url=(
+                    f"/api/app/files/{f.id}?token={make_download_token(f.id, contractor_id)}"
+                    if f.url in stored_urls
+                    else None
+                ),
+            )
+            for f in files
+        ],
         properties=[PropertyOut(id=p.id, name=p.name, quantity=p.quantity, comment=p.comment) for p in props],
     )
 
 
+@router.get("/files/{file_id}")
+def download_file(
+    file_id: int,
+    contractor_id: int = Depends(get_download_contractor_id),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+):
+    f = db.get(models.OrderFile, file_id)
+    if not f or not membership.has(contractor_id, f.order_id):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    stored = db.get(models.StoredFile, f.url)
+    path = filestore.store.path_for(stored.sha256) if stored else None
+    if not stored or not path.exists():
+        # ещё не скачан (или хранилище выключено) — отправляем на исходный URL
+        return RedirectResponse(url=f.url, status_code=302)
+
+    if filestore.etag_matches(if_none_match, stored.sha256):
+        return Response(status_code=304, headers={"ETag": f'"{stored.sha256}"'})
+
+    return filestore.BlobResponse(
+        path,
+        stored.sha256,
+        media_type=stored.content_type or None,
+        filename=f.name or None,
+        content_disposition_type="inline",
+    )
+
+
 @router.post("/orders/{order_id}/stages")
 def add_stage(
     order_id: str,
@@ -130,6 +182,8 @@ def add_stage(
         comment=payload.comment,
     )
     db.add(stage)
+    db.flush()
+    crud.add_stage_to_rollup(db, stage)
     db.commit()
     return {"ok": True, "stage_id": stage.id}
 
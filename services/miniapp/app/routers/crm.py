@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from ..auth_crm import crm_auth
 from ..deps import get_db
-from ..schemas import OrderUpsertRequest, ContractorUpdateCRMRequest
-from .. import crud
+from ..schemas import (
+    OrderUpsertRequest,
+    ContractorUpdateCRMRequest,
+    ContractorBulkUpdateRequest,
+    ContractorBulkUpdateResponse,
+    HoursReportResponse,
+)
+from .. import crud, filestore
+from ..config import settings
 
 router = APIRouter(prefix="/api/crm", tags=["crm"], dependencies=[Depends(crm_auth)])
 
+REPORT_GROUP_BY = {"order", "contractor", "day", "week", "month"}
+
 
 @router.post("/orders")
-def upsert_order(payload: OrderUpsertRequest, db: Session = Depends(get_db)):
+def upsert_order(payload: OrderUpsertRequest, background: BackgroundTasks, db: Session = Depends(get_db)):
     order = crud.upsert_order(db, payload)
     db.commit()
+    if settings.files_ingest_enabled and payload.files:
+        background.add_task(filestore.ingest_urls, [f.url for f in payload.files])
     return {"ok": True, "order_id": order.order_id}
 
 
@@ -28,3 +42,38 @@ def update_contractor(tg_id: int, payload: ContractorUpdateCRMRequest, db: Sessi
     c = crud.update_contractor_from_crm(db, tg_id, payload)
     db.commit()
     return {"ok": True, "tg_id": c.tg_id}
+
+
+@router.put("/contractors", response_model=ContractorBulkUpdateResponse)
+def bulk_update_contractors(payload: ContractorBulkUpdateRequest, db: Session = Depends(get_db)):
+    results = crud.bulk_update_contractors_from_crm(db, payload.items)
+    db.commit()
+    created = sum(1 for r in results if r["created"])
+    return ContractorBulkUpdateResponse(
+        ok=True,
+        updated=len(results) - created,
+        created=created,
+        results=results,
+    )
+
+
+@router.get("/reports/hours", response_model=HoursReportResponse)
+def hours_report(
+    date_from: date,
+    date_to: date,
+    group_by: str = Query("order,contractor", description="order,contractor,day|week|month через запятую"),
+    order_id: Optional[str] = None,
+    contractor_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    keys = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = set(keys) - REPORT_GROUP_BY
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown group_by: {', '.join(sorted(unknown))}")
+    if len({"day", "week", "month"} & set(keys)) > 1:
+        raise HTTPException(status_code=422, detail="Use only one of day/week/month in group_by")
+    if date_from > date_to:
+        raise HTTPException(status_code=422, detail="date_from must be <= date_to")
+
+    rows = crud.hours_report(db, date_from, date_to, keys, order_id=order_id, contractor_id=contractor_id)
+    return HoursReportResponse(date_from=date_from, date_to=date_to, group_by=keys, rows=rows)
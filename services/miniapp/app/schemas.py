@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional, Literal
 
 from pydantic import BaseModel, Field
@@ -50,6 +50,43 @@ class ContractorUpdateCRMRequest(BaseModel):
     payment_info: Optional[str] = None
 
 
+class ContractorBulkUpdateItem(ContractorUpdateCRMRequest):
+    tg_id: int
+
+
+class ContractorBulkUpdateRequest(BaseModel):
+    items: List[ContractorBulkUpdateItem] = Field(default_factory=list)
+
+
+class ContractorBulkUpdateResult(BaseModel):
+    tg_id: int
+    ok: bool
+    created: bool
+
+
+class ContractorBulkUpdateResponse(BaseModel):
+    ok: bool
+    updated: int
+    created: int
+    results: List[ContractorBulkUpdateResult]
+
+
+class HoursReportRow(BaseModel):
+    order_id: Optional[str] = None
+    contractor_id: Optional[int] = None
+    period: Optional[date] = None
+    hours: int
+    amount: int
+    stages_count: int
+
+
+class HoursReportResponse(BaseModel):
+    date_from: date
+    date_to: date
+    group_by: List[str]
+    rows: List[HoursReportRow]
+
+
 class OrderOut(BaseModel):
     order_id: str
     chat_link: Optional[str]
@@ -79,6 +116,7 @@ class FileOut(BaseModel):
     id: int
     name: Optional[str]
     url: str
+    download_url: Optional[str] = None
 
 
 class ContractorOut(BaseModel):
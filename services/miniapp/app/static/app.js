@@ -44,6 +44,11 @@ async function api(path, options = {}){
   return res.json();
 }
 
+function fileHref(f){
+  // download_url уже подписан сервером (короткоживущий token) — initData в ссылки не кладём
+  return f.download_url || f.url;
+}
+
 function escapeHtml(s){
   return (s||"").replaceAll("&","&amp;").replaceAll("<","&lt;").replaceAll(">","&gt;");
 }
@@ -92,7 +97,7 @@ function renderOrder(){
 
   const filesHtml = files.length ? files.map(f => `<div class="item">
     <div class="item-title">${escapeHtml(f.name || "Файл")}</div>
-    <div class="item-sub"><a href="${escapeHtml(f.url)}" target="_blank">${escapeHtml(f.url)}</a></div>
+    <div class="item-sub"><a href="${escapeHtml(fileHref(f))}" target="_blank">${escapeHtml(f.url)}</a></div>
   </div>`).join("") : `<p class="p">Файлы не прикреплены.</p>`;
 
   const stagesHtml = stages.length ? stages.map(s => {
@@ -0,0 +1,145 @@
+"""Общая часть нагрузочного режима консольных тестеров (bot1_tester.py / bot3_tester.py --action load).
+
+Тестеры запускаются из репозитория и подключают модуль из services/scripts; сервис-специфичны
+только генерация сценариев и отправка одного запроса (send_one).
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Tuple
+
+import httpx
+
+Scenario = Tuple[str, Dict[str, Any]]
+# (client, action, payload) -> ключ ошибки для сводки или None
+SendOne = Callable[[httpx.AsyncClient, str, Dict[str, Any]], Awaitable[Optional[str]]]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    # nearest-rank, без numpy
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    v = sorted(values)
+    return {
+        "p50": round(percentile(v, 50) * 1000, 1),
+        "p95": round(percentile(v, 95) * 1000, 1),
+        "p99": round(percentile(v, 99) * 1000, 1),
+        "max": round((v[-1] if v else 0.0) * 1000, 1),
+        "mean": round((sum(v) / len(v) if v else 0.0) * 1000, 1),
+    }
+
+
+def read_scenarios(path: str, actions: Collection[str]) -> List[Scenario]:
+    # JSONL: {"action": ..., "payload": {...}}
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if row["action"] not in actions:
+                    raise ValueError(f"unknown action in {path}: {row['action']}")
+                items.append((row["action"], row["payload"]))
+    return items
+
+
+def save_scenarios(path: str, scenarios: List[Scenario]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for action, payload in scenarios:
+            f.write(json.dumps({"action": action, "payload": payload}, ensure_ascii=False) + "\n")
+
+
+async def run_load(
+    base: str,
+    scenarios: List[Scenario],
+    send_one: SendOne,
+    concurrency: int,
+    rate: float,
+    timeout: float,
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {}
+    errors: Counter = Counter()
+    sem = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    async def one(i: int, action: str, payload: Dict[str, Any]) -> None:
+        # при rate отсчёт от запланированного момента: ожидание свободного слота тоже входит в задержку
+        planned = started + i / rate if rate else None
+        if planned is not None:
+            await asyncio.sleep(max(0.0, planned - time.monotonic()))
+        async with sem:
+            t0 = planned if planned is not None else time.monotonic()
+            error = await send_one(client, action, payload)
+            latencies.setdefault(action, []).append(time.monotonic() - t0)
+            if error:
+                errors[f"{action}: {error}"] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits, headers=headers) as client:
+        await asyncio.gather(*(one(i, a, p) for i, (a, p) in enumerate(scenarios)))
+    elapsed = time.monotonic() - started
+
+    total = sum(len(v) for v in latencies.values())
+    failed = sum(errors.values())
+    return {
+        "base_url": base,
+        "requests": total,
+        "ok": total - failed,
+        "failed": failed,
+        "concurrency": concurrency,
+        "target_rate": rate,
+        "duration_sec": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary([x for v in latencies.values() for x in v]),
+        "by_action": {a: {"requests": len(v), "latency_ms": latency_summary(v)} for a, v in latencies.items()},
+        "errors": dict(errors.most_common()),
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lat = report["latency_ms"]
+    lines = [
+        f"requests: {report['requests']}  ok: {report['ok']}  failed: {report['failed']}",
+        f"duration: {report['duration_sec']}s  throughput: {report['throughput_rps']} req/s",
+        f"latency ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}",
+    ]
+    for action, st in report["by_action"].items():
+        a = st["latency_ms"]
+        lines.append(f"  {action}: n={st['requests']} p50={a['p50']} p95={a['p95']} p99={a['p99']}")
+    if report["errors"]:
+        lines.append("errors:")
+        lines += [f"  {n:>6}  {key}" for key, n in report["errors"].items()]
+    return "\n".join(lines)
+
+
+def main_load(
+    args,
+    generate: Callable[[Any], List[Scenario]],
+    actions: Collection[str],
+    send_one: SendOne,
+    headers: Optional[Dict[str, str]] = None,
+) -> None:
+    """--action load: сценарии (--replay или generate), прогон, отчёт в stdout и/или --json-out."""
+    base = args.base_url.rstrip("/")
+    scenarios = read_scenarios(args.replay, actions) if args.replay else list(generate(args))
+    if args.save_scenarios:
+        save_scenarios(args.save_scenarios, scenarios)
+    report = asyncio.run(
+        run_load(base, scenarios, send_one, args.concurrency, args.rate, args.timeout, headers=headers)
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json_out == "-":
+        print(text)
+        return
+    print(format_report(report))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            f.write(text)